@@ -1,63 +1,161 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, Response, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import Optional, List
-from sqlalchemy.orm import Session
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Final
+from sqlalchemy import select, insert, update, delete, bindparam, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached
 import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import anyio
+from datetime import datetime
 from dotenv import load_dotenv
+from cachetools import TTLCache
 import json
+import orjson
 from pathlib import Path
 
-from services.openrouter_service import OpenRouterService
+from services.openrouter_service import OpenRouterService, get_http_client, close_http_client
 from services.file_service import FileService
-from services.database_service import get_db, init_db
+from services.database_service import get_db, init_db, SessionLocal, engine
 from services.auth_service import (
-    verify_password, 
+    verify_and_update_password,
     get_password_hash, 
     create_access_token, 
     decode_access_token
 )
 from services.story_service import StoryService
-from models import User, Project, Document, ChatMessage, FileUpload, Story, Chapter, Character, BeatScene, WorldBuildingElement, KeyEvent
+from services.semantic_cache import SemanticCache
+from services.token_budget import trim_to_token_budget, load_encoder
+from models import (
+    User, Project, Document, ChatMessage, FileUpload, Story, Chapter, Character, BeatScene, WorldBuildingElement, KeyEvent,
+    EMAIL_MAX_LENGTH, USER_NAME_MAX_LENGTH, PROJECT_NAME_MAX_LENGTH, MODEL_ID_MAX_LENGTH,
+    FILENAME_MAX_LENGTH, MIME_TYPE_MAX_LENGTH
+)
 
 # Lazy import for vector service to avoid chromadb dependency issues
 try:
-    from services.vector_service import VectorService
+    from services.vector_service import VectorService, EmbeddingQueueFull
     VECTOR_SERVICE_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: VectorService not available: {e}")
     VectorService = None
+    EmbeddingQueueFull = None
     VECTOR_SERVICE_AVAILABLE = False
 
 load_dotenv()
 
-app = FastAPI(title="Membrane API", version="1.0.0")
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "200"))
+# asyncio.to_thread (vector store and other blocking calls from async handlers)
+# otherwise gets min(32, cpus + 4) threads, i.e. 5 on a single-CPU container
+TO_THREAD_POOL_SIZE = int(os.getenv("TO_THREAD_POOL_SIZE", "64"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync endpoints and dependencies run in AnyIO's threadpool (40 threads by default)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=TO_THREAD_POOL_SIZE, thread_name_prefix="to_thread")
+    )
+    # The tokenizer fetches its vocabulary on first use; do that before serving requests
+    await asyncio.to_thread(load_encoder)
+    yield
+    # Close pooled connections cleanly on shutdown
+    await close_http_client()
+    engine.dispose()
+    if vector_service is not None and vector_service.enabled:
+        vector_service.engine.dispose()
+
+app = FastAPI(title="Membrane API", version="1.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Initialize database
 init_db()
 
 # CORS configuration - allow Codespaces, localhost, and Railway
+class OriginSetCORSMiddleware(CORSMiddleware):
+    """CORSMiddleware that checks the exact-origin set before the regex"""
+    def is_allowed_origin(self, origin: str) -> bool:
+        if origin in self.allow_origins:
+            return True
+        return self.allow_origin_regex is not None and self.allow_origin_regex.fullmatch(origin) is not None
+
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "https://*.app.github.dev",
-        "https://*.githubpreview.dev",
-        "https://*.railway.app",
-        "https://*.up.railway.app"
-    ],
-    allow_origin_regex=r"https://.*\.app\.github\.dev|https://.*\.githubpreview\.dev|https://.*\.railway\.app|https://.*\.up\.railway\.app",
+    OriginSetCORSMiddleware,
+    allow_origins=frozenset({"http://localhost:3000"}),
+    # Subdomain wildcards; railway.app also covers *.up.railway.app
+    allow_origin_regex=r"https://[^/]+\.(?:app\.github\.dev|githubpreview\.dev|railway\.app)",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
     expose_headers=["*"],
 )
 
+if EmbeddingQueueFull is not None:
+    @app.exception_handler(EmbeddingQueueFull)
+    async def embedding_queue_full_handler(request: Request, exc: EmbeddingQueueFull):
+        return ORJSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# Available LLM models; the response body never changes, so serialize it once
+AVAILABLE_MODELS = [
+    {
+        "id": "anthropic/claude-3.5-sonnet",
+        "name": "Claude 3.5 Sonnet",
+        "provider": "Anthropic",
+        "context_length": 200000
+    },
+    {
+        "id": "x-ai/grok-4.1-fast",
+        "name": "Grok 4.1 Fast",
+        "provider": "xAI",
+        "context_length": 131072
+    },
+    {
+        "id": "deepseek/deepseek-v3.2",
+        "name": "DeepSeek v3.2",
+        "provider": "DeepSeek",
+        "context_length": 64000
+    },
+    {
+        "id": "openai/gpt-oss-120b",
+        "name": "GPT-OSS-120B",
+        "provider": "OpenAI",
+        "context_length": 128000
+    },
+    {
+        "id": "google/gemini-2.5-flash",
+        "name": "Gemini 2.5 Flash",
+        "provider": "Google",
+        "context_length": 1000000
+    }
+]
+_MODELS_JSON = json.dumps({"models": AVAILABLE_MODELS})
+MODEL_CONTEXT_LENGTHS = {m["id"]: m["context_length"] for m in AVAILABLE_MODELS}
+DEFAULT_CONTEXT_LENGTH = min(MODEL_CONTEXT_LENGTHS.values())
+
+# Tokens held back from the document for the system prompt, history, memories and the reply
+DOCUMENT_TOKEN_RESERVE = 8192
+
 # Initialize services
 openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
 openrouter = OpenRouterService(api_key=openrouter_api_key)
+if not openrouter_api_key:
+    print("⚠️  OPENROUTER_API_KEY not set - AI generation endpoints will fail")
+
+# Headers for direct OpenRouter calls, built once rather than per request
+SITE_URL = os.getenv("SITE_URL", "http://localhost:8000")
+SITE_NAME = os.getenv("SITE_NAME", "StoryEngine")
+OPENROUTER_HEADERS: Final[dict] = {
+    "Authorization": f"Bearer {openrouter_api_key}",
+    "Content-Type": "application/json",
+    "HTTP-Referer": SITE_URL,
+    "X-Title": SITE_NAME
+}
 
 # Try to initialize vector service, but make it optional
 vector_service = None
@@ -71,19 +169,25 @@ if VECTOR_SERVICE_AVAILABLE:
     except Exception as e:
         print(f"Warning: Could not initialize VectorService: {e}")
 
+semantic_cache = SemanticCache(vector_service)
+
 file_service = FileService(upload_dir=os.getenv("UPLOAD_DIR", "./data/uploads"))
 story_service = StoryService(openrouter_api_key=openrouter_api_key)
 
-# Authentication dependency
-async def get_current_user(
-    authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token. In dev mode, creates/uses default user if no auth."""
+# Dev user id, resolved once per process so unauthenticated requests skip the email lookup
+_DEV_USER_ID: Optional[int] = None
+_dev_user_lock = threading.Lock()
+
+def _get_dev_user(db: Session) -> User:
+    """Get or create the default dev user, caching its id after the first lookup"""
+    global _DEV_USER_ID
     
-    # Development mode: allow unauthenticated access with default user
-    if not authorization or not authorization.startswith("Bearer "):
-        # Get or create default dev user
+    if _DEV_USER_ID is not None:
+        dev_user = db.get(User, _DEV_USER_ID)
+        if dev_user:
+            return dev_user
+    
+    with _dev_user_lock:
         dev_user = db.query(User).filter(User.email == "dev@example.com").first()
         if not dev_user:
             dev_user = User(
@@ -92,9 +196,47 @@ async def get_current_user(
                 name="Dev User"
             )
             db.add(dev_user)
-            db.commit()
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker process created it first
+                db.rollback()
+                dev_user = db.query(User).filter(User.email == "dev@example.com").one()
             db.refresh(dev_user)
-        return dev_user
+        _DEV_USER_ID = dev_user.id
+    return dev_user
+
+# Users by bearer token, kept briefly so hot paths skip the user query.
+# get_current_user runs in the threadpool, so access goes through a lock.
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_user_cache_lock = threading.Lock()
+
+def _detached_user_snapshot(user: User) -> User:
+    """
+    Detached copy of a user's columns for _user_cache. Caching the session's
+    own instance doesn't work: the route's commit expires it, and the next
+    merge would reload it from the database.
+    """
+    snapshot = User(
+        id=user.id,
+        email=user.email,
+        password_hash=user.password_hash,
+        name=user.name,
+        created_at=user.created_at
+    )
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+# Authentication dependency
+def get_current_user(
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user from JWT token. In dev mode, creates/uses default user if no auth."""
+    
+    # Development mode: allow unauthenticated access with default user
+    if not authorization or not authorization.startswith("Bearer "):
+        return _get_dev_user(db)
     
     token = authorization.replace("Bearer ", "")
     payload = decode_access_token(token)
@@ -102,17 +244,133 @@ async def get_current_user(
     if not payload or "user_id" not in payload:
         raise HTTPException(status_code=401, detail="Invalid token")
     
+    # Reattach a recently loaded user to this session without querying
+    with _user_cache_lock:
+        cached_user = _user_cache.get(token)
+    if cached_user is not None:
+        return db.merge(cached_user, load=False)
+    
     user = db.query(User).filter(User.id == payload["user_id"]).first()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     
+    with _user_cache_lock:
+        _user_cache[token] = _detached_user_snapshot(user)
     return user
 
+# Ownership-scoped lookups, built once so each request reuses the statement
+# and its memoized cache key instead of rebuilding the query
+_OWNED_PROJECT_STMT = select(Project).where(
+    Project.id == bindparam("project_id"),
+    Project.user_id == bindparam("user_id")
+)
+_OWNED_PROJECT_ID_STMT = select(Project.id).where(
+    Project.id == bindparam("project_id"),
+    Project.user_id == bindparam("user_id")
+)
+_OWNED_DOCUMENT_STMT = select(Document).join(Project, Document.project_id == Project.id).where(
+    Project.id == bindparam("project_id"),
+    Project.user_id == bindparam("user_id")
+)
+_OWNED_UPLOAD_STMT = select(FileUpload).join(Project, FileUpload.project_id == Project.id).where(
+    FileUpload.id == bindparam("file_id"),
+    Project.id == bindparam("project_id"),
+    Project.user_id == bindparam("user_id")
+)
+_OWNED_UPLOAD_PROCESSED_STMT = select(FileUpload.processed).join(Project, FileUpload.project_id == Project.id).where(
+    FileUpload.id == bindparam("file_id"),
+    Project.id == bindparam("project_id"),
+    Project.user_id == bindparam("user_id")
+)
+
+_CHAPTER_OWNER_STMT = select(Chapter.story_id, Story.user_id).outerjoin(
+    Story, Story.id == Chapter.story_id
+).where(Chapter.id == bindparam("chapter_id"))
+
+# Project ownership helpers
+def get_owned_project(db: Session, project_id: int, user_id: int) -> Project:
+    """Load a project owned by the user, raising 404 otherwise"""
+    project = db.execute(
+        _OWNED_PROJECT_STMT, {"project_id": project_id, "user_id": user_id}
+    ).scalar_one_or_none()
+    
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project
+
+def verify_project_ownership(db: Session, project_id: int, user_id: int) -> int:
+    """Check project ownership with an id-only query, raising 404 otherwise"""
+    owned_id = db.execute(
+        _OWNED_PROJECT_ID_STMT, {"project_id": project_id, "user_id": user_id}
+    ).scalar_one_or_none()
+    if owned_id is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return owned_id
+
+# (chapter_id, user_id) -> story_id for confirmed chapter ownership
+_chapter_owner_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+_chapter_owner_cache_lock = threading.Lock()
+
+def authorize_chapter(db: Session, chapter_id: int, user_id: int) -> int:
+    """
+    Check chapter ownership through its story in one query, returning the
+    story id. Raises 404 for a missing chapter, 403 for another user's.
+    Recent confirmations are reused while the story's own ownership entry
+    is still cached, so deleting the story invalidates them.
+    """
+    key = (chapter_id, user_id)
+    with _chapter_owner_cache_lock:
+        story_id = _chapter_owner_cache.get(key)
+    if story_id is not None and story_service.authorize_story(db, story_id, user_id):
+        return story_id
+    
+    row = db.execute(_CHAPTER_OWNER_STMT, {"chapter_id": chapter_id}).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    if row.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    story_service.remember_owner(row.story_id, user_id)
+    with _chapter_owner_cache_lock:
+        _chapter_owner_cache[key] = row.story_id
+    return row.story_id
+
+def owned_character_criteria(char_id: int, story_id: int, user_id: int) -> tuple:
+    """WHERE clauses matching a character only if its story belongs to the user"""
+    return (
+        Character.id == char_id,
+        Character.story_id == story_id,
+        Character.story_id.in_(select(Story.id).where(Story.user_id == user_id))
+    )
+
+def _update_returning(db: Session, model, criteria, values: dict, columns):
+    """
+    UPDATE ... RETURNING the given columns in one round trip, instead of
+    SELECT, flush and refresh. Returns None when no row matches.
+    The UPDATE only matches rows where a value actually differs, so no-op
+    saves write nothing and fall through to a plain read.
+    """
+    if values:
+        changed = or_(*(getattr(model, key).is_distinct_from(value) for key, value in values.items()))
+        stmt = update(model).where(*criteria, changed).values(**values).returning(*columns)
+        row = db.execute(stmt.execution_options(synchronize_session=False)).first()
+        if row is not None:
+            db.commit()
+            return row
+    return db.execute(select(*columns).where(*criteria)).first()
+
+async def project_collection(
+    project_id: int,
+    current_user: User = Depends(get_current_user)
+) -> str:
+    """Vector store collection holding a project's memories"""
+    return f"user_{current_user.id}_project_{project_id}"
+
 # Request/Response Models
 class SignupRequest(BaseModel):
-    email: str
+    email: str = Field(max_length=EMAIL_MAX_LENGTH)
     password: str
-    name: Optional[str] = None
+    name: Optional[str] = Field(default=None, max_length=USER_NAME_MAX_LENGTH)
 
 class LoginRequest(BaseModel):
     email: str
@@ -124,11 +382,11 @@ class AuthResponse(BaseModel):
     user: dict
 
 class ProjectCreate(BaseModel):
-    name: str
+    name: str = Field(max_length=PROJECT_NAME_MAX_LENGTH)
     description: Optional[str] = None
 
 class ProjectUpdate(BaseModel):
-    name: Optional[str] = None
+    name: Optional[str] = Field(default=None, max_length=PROJECT_NAME_MAX_LENGTH)
     description: Optional[str] = None
 
 class DocumentUpdate(BaseModel):
@@ -141,7 +399,7 @@ class ChatRequest(BaseModel):
     selected_text: Optional[str] = None
     purpose: str = "writing"
     partner: str = "balanced"
-    model: str = "anthropic/claude-3.5-sonnet"
+    model: str = Field(default="anthropic/claude-3.5-sonnet", max_length=MODEL_ID_MAX_LENGTH)
     
 class GhostSuggestionRequest(BaseModel):
     text: str
@@ -193,16 +451,24 @@ class KeyEventCreate(BaseModel):
 
 class AIGenerateRequest(BaseModel):
     context: str
-    type: str  # 'summary', 'character', 'plot', 'beats', 'worldbuilding'
+    type: str  # 'summary', 'character', 'plot', 'beats', 'chapter', 'character_bundle', 'worldbuilding'
     category: Optional[str] = None  # For world-building
 
+class AIGenerateInlineRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    prompt: str = Field(min_length=1)
+    type: str = "prose"
+    model: str = "deepseek/deepseek-chat-v3.1"
+    stream: bool = False
+
 class ChapterSummarizeRequest(BaseModel):
     text: str
     prompt: Optional[str] = None
 
 # Authentication Endpoints
 @app.post("/api/auth/signup", response_model=AuthResponse)
-async def signup(request: SignupRequest, db: Session = Depends(get_db)):
+def signup(request: SignupRequest, db: Session = Depends(get_db)):
     """Create a new user account"""
     # Validate password length (bcrypt has 72 byte limit)
     if len(request.password) > 72:
@@ -240,13 +506,22 @@ async def signup(request: SignupRequest, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/auth/login", response_model=AuthResponse)
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
+def login(request: LoginRequest, db: Session = Depends(get_db)):
     """Login with email and password"""
     user = db.query(User).filter(User.email == request.email).first()
     
-    if not user or not verify_password(request.password, user.password_hash):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    verified, new_hash = verify_and_update_password(request.password, user.password_hash)
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Rehash legacy bcrypt passwords with argon2id
+    if new_hash:
+        user.password_hash = new_hash
+        db.commit()
+    
     # Create access token
     access_token = create_access_token(data={"user_id": user.id, "email": user.email})
     
@@ -271,27 +546,19 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 # Project Endpoints
 @app.get("/api/projects")
-async def list_projects(
+def list_projects(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """List all projects for the current user"""
-    projects = db.query(Project).filter(Project.user_id == current_user.id).all()
-    return {
-        "projects": [
-            {
-                "id": p.id,
-                "name": p.name,
-                "description": p.description,
-                "created_at": p.created_at.isoformat(),
-                "updated_at": p.updated_at.isoformat()
-            }
-            for p in projects
-        ]
-    }
+    rows = db.execute(
+        select(Project.id, Project.name, Project.description, Project.created_at, Project.updated_at)
+        .where(Project.user_id == current_user.id)
+    ).all()
+    return ORJSONResponse({"projects": [dict(r._mapping) for r in rows]})
 
 @app.post("/api/projects")
-async def create_project(
+def create_project(
     request: ProjectCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -311,52 +578,40 @@ async def create_project(
     db.add(document)
     db.commit()
     
-    return {
+    return ORJSONResponse({
         "id": project.id,
         "name": project.name,
         "description": project.description,
-        "created_at": project.created_at.isoformat(),
-        "updated_at": project.updated_at.isoformat()
-    }
+        "created_at": project.created_at,
+        "updated_at": project.updated_at
+    })
 
 @app.get("/api/projects/{project_id}")
-async def get_project(
+def get_project(
     project_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific project"""
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
-    
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    project = get_owned_project(db, project_id, current_user.id)
     
-    return {
+    return ORJSONResponse({
         "id": project.id,
         "name": project.name,
         "description": project.description,
-        "created_at": project.created_at.isoformat(),
-        "updated_at": project.updated_at.isoformat()
-    }
+        "created_at": project.created_at,
+        "updated_at": project.updated_at
+    })
 
 @app.put("/api/projects/{project_id}")
-async def update_project(
+def update_project(
     project_id: int,
     request: ProjectUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a project"""
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
-    
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    project = get_owned_project(db, project_id, current_user.id)
     
     if request.name is not None:
         project.name = request.name
@@ -366,28 +621,22 @@ async def update_project(
     db.commit()
     db.refresh(project)
     
-    return {
+    return ORJSONResponse({
         "id": project.id,
         "name": project.name,
         "description": project.description,
-        "created_at": project.created_at.isoformat(),
-        "updated_at": project.updated_at.isoformat()
-    }
+        "created_at": project.created_at,
+        "updated_at": project.updated_at
+    })
 
 @app.delete("/api/projects/{project_id}")
-async def delete_project(
+def delete_project(
     project_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a project"""
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
-    
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    project = get_owned_project(db, project_id, current_user.id)
     
     db.delete(project)
     db.commit()
@@ -396,136 +645,218 @@ async def delete_project(
 
 # Document Endpoints
 @app.get("/api/projects/{project_id}/document")
-async def get_document(
+def get_document(
     project_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get the document for a project"""
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
-    
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    document = db.query(Document).filter(Document.project_id == project_id).first()
+    document = db.execute(
+        _OWNED_DOCUMENT_STMT, {"project_id": project_id, "user_id": current_user.id}
+    ).scalars().first()
     
     if not document:
         # Create if doesn't exist
+        verify_project_ownership(db, project_id, current_user.id)
         document = Document(project_id=project_id, content="")
         db.add(document)
         db.commit()
         db.refresh(document)
     
-    return {
+    return ORJSONResponse({
         "content": document.content,
-        "updated_at": document.updated_at.isoformat()
-    }
+        "updated_at": document.updated_at
+    })
 
 @app.put("/api/projects/{project_id}/document")
-async def update_document(
+def update_document(
     project_id: int,
     request: DocumentUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update the document for a project"""
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
-    
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    document = db.query(Document).filter(Document.project_id == project_id).first()
+    document = db.execute(
+        _OWNED_DOCUMENT_STMT, {"project_id": project_id, "user_id": current_user.id}
+    ).scalars().first()
     
     if not document:
+        verify_project_ownership(db, project_id, current_user.id)
         document = Document(project_id=project_id, content=request.content)
         db.add(document)
+    elif document.content == request.content:
+        # Unchanged autosave; nothing to write
+        return ORJSONResponse({
+            "content": document.content,
+            "updated_at": document.updated_at
+        })
     else:
         document.content = request.content
     
     db.commit()
     db.refresh(document)
     
-    return {
+    return ORJSONResponse({
         "content": document.content,
-        "updated_at": document.updated_at.isoformat()
-    }
+        "updated_at": document.updated_at
+    })
 
 # Health check
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "membrane-api"}
 
+# Server-sent event framing, pre-encoded so chunks are emitted as bytes
+_SSE_DATA = b"data: "
+_SSE_END = b"\n\n"
+_SSE_DONE = b"data: [DONE]\n\n"
+
+# Chat prompt templates, filled per request with str.format_map
+_CHAT_CONTEXT_TEMPLATE = """Purpose: {purpose}
+Partner mode: {partner}
+
+Full Document content:
+{document}
+
+{selected}
+
+Recent conversation:
+{history}{memories}
+"""
+
+_MEMORIES_TEMPLATE = """
+
+UPLOADED CONTEXT FILES:
+The user has uploaded the following files for you to reference:
+
+{files}
+
+You MUST acknowledge and use the information from these uploaded files when relevant to the user's questions.
+"""
+
+# Chat helpers
+def _fetch_recent_messages(db: Session, project_id: int) -> List[ChatMessage]:
+    """Last 10 chat messages for a project, oldest first"""
+    recent_messages = db.query(ChatMessage).filter(
+        ChatMessage.project_id == project_id
+    ).order_by(ChatMessage.created_at.desc()).limit(10).all()
+    recent_messages.reverse()
+    return recent_messages
+
+def _save_chat_exchange(
+    project_id: int,
+    model: str,
+    user_content: str,
+    assistant_content: str,
+    user_created_at: datetime
+):
+    """
+    Persist a user/assistant exchange with one INSERT in one transaction
+    (runs as a background task once the response has been sent)
+    """
+    rows = [{
+        "project_id": project_id,
+        "role": "user",
+        "content": user_content,
+        "model": model,
+        "created_at": user_created_at
+    }]
+    if assistant_content:
+        rows.append({
+            "project_id": project_id,
+            "role": "assistant",
+            "content": assistant_content,
+            "model": model,
+            "created_at": datetime.utcnow()
+        })
+    
+    db = SessionLocal()
+    try:
+        db.execute(insert(ChatMessage), rows)
+        db.commit()
+    finally:
+        db.close()
+
 # Chat endpoint with streaming
 @app.post("/api/projects/{project_id}/chat/stream")
 async def chat_stream(
     project_id: int,
     request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    no_cache: bool = False,
+    collection_name: str = Depends(project_collection),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Stream AI responses in real-time"""
     # Verify project ownership
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    await asyncio.to_thread(verify_project_ownership, db, project_id, current_user.id)
+    
+    # Semantic cache: replay a stored answer for a near-identical question on the same document
+    cache_collection = SemanticCache.collection_name(current_user.id, project_id)
+    document_hash = SemanticCache.content_hash(request.document_content)
+    cache_scope = {
+        "kind": "chat",
+        "purpose": request.purpose,
+        "partner": request.partner,
+        "model": request.model,
+        "document": document_hash
+    }
+    cache_query = "\n".join([request.purpose, request.partner, request.message, request.selected_text or ""])
+    cached_response, cache_embedding = None, None
+    if not no_cache:
+        cached_response, cache_embedding = await semantic_cache.lookup_cached(cache_collection, cache_query, cache_scope)
+    
+    if cached_response is not None:
+        background_tasks.add_task(
+            _save_chat_exchange,
+            project_id,
+            request.model,
+            request.message,
+            cached_response,
+            datetime.utcnow()
+        )
+        
+        # The whole answer is already known, so skip SSE framing and send one JSON body
+        return ORJSONResponse({"content": cached_response}, background=background_tasks)
     
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    # Memory search (embedding API + ANN) and the history query are independent, so run them together
     
-    # Get relevant memories from vector store
-    collection_name = f"user_{current_user.id}_project_{project_id}"
-    memories = []
-    if vector_service and vector_service.enabled:
+    async def search_memories() -> List[str]:
+        if not (vector_service and vector_service.enabled):
+            print("⚠️  Vector service not available for memory search")
+            return []
         try:
             # Search for top 10 chunks to ensure we get multiple parts of large files
-            memories = await vector_service.search(collection_name, request.message, top_k=10)
-            print(f"✅ Found {len(memories)} memories for query: {request.message[:50]}...")
+            found = await vector_service.search(collection_name, request.message, top_k=10)
+            print(f"✅ Found {len(found)} memories for query: {request.message[:50]}...")
+            return found
         except Exception as e:
             print(f"⚠️  Error searching memories: {e}")
-    else:
-        print("⚠️  Vector service not available for memory search")
+            return []
     
-    # Get recent chat history
-    recent_messages = db.query(ChatMessage).filter(
-        ChatMessage.project_id == project_id
-    ).order_by(ChatMessage.created_at.desc()).limit(10).all()
-    recent_messages.reverse()  # oldest first
+    memories, recent_messages = await asyncio.gather(
+        search_memories(),
+        asyncio.to_thread(_fetch_recent_messages, db, project_id)
+    )
     
     chat_history = "\n".join([
         f"{msg.role}: {msg.content[:500]}" for msg in recent_messages
     ]) if recent_messages else "(No previous conversation)"
     
-    # Build context - include FULL document content
-    memories_section = ""
-    if memories:
-        memories_section = f"""
-
-UPLOADED CONTEXT FILES:
-The user has uploaded the following files for you to reference:
-
-{chr(10).join(f"File content: {m}" for m in memories)}
-
-You MUST acknowledge and use the information from these uploaded files when relevant to the user's questions.
-"""
-    
-    context = f"""Purpose: {request.purpose}
-Partner mode: {request.partner}
-
-Full Document content:
-{request.document_content}
-
-{f"Selected text: {request.selected_text}" if request.selected_text else ""}
-
-Recent conversation:
-{chat_history}{memories_section}
-"""
+    # Build context - include as much of the document as the model's context window allows
+    document_budget = MODEL_CONTEXT_LENGTHS.get(request.model, DEFAULT_CONTEXT_LENGTH) - DOCUMENT_TOKEN_RESERVE
+    document_content = trim_to_token_budget(request.document_content, document_budget, cache_key=document_hash)
+    context = _CHAT_CONTEXT_TEMPLATE.format_map({
+        "purpose": request.purpose,
+        "partner": request.partner,
+        "document": document_content,
+        "selected": f"Selected text: {request.selected_text}" if request.selected_text else "",
+        "history": chat_history,
+        "memories": _MEMORIES_TEMPLATE.format_map({
+            "files": "\n".join("File content: " + m for m in memories)
+        }) if memories else ""
+    })
     
     # Debug: Log what memories are being sent
     if memories:
@@ -536,20 +867,21 @@ Recent conversation:
     else:
         print("⚠️  No memories to send to AI")
     
-    # Save user message to database
-    user_message = ChatMessage(
-        project_id=project_id,
-        role="user",
-        content=request.message,
-        model=request.model
-    )
-    db.add(user_message)
-    db.commit()
-    
     assistant_response = ""
+    stream_completed = False
+    user_created_at = datetime.utcnow()
+    
+    def persist_exchange():
+        # Runs after the stream ends (or the client disconnects), so the
+        # client sees [DONE] before we pay for the commit
+        _save_chat_exchange(project_id, request.model, request.message, assistant_response, user_created_at)
+        if stream_completed and not no_cache:
+            semantic_cache.remember(cache_collection, cache_query, cache_scope, cache_embedding, assistant_response)
+    
+    background_tasks.add_task(persist_exchange)
     
     async def generate():
-        nonlocal assistant_response
+        nonlocal assistant_response, stream_completed
         async for chunk in openrouter.stream_chat(
             message=request.message,
             context=context,
@@ -557,39 +889,34 @@ Recent conversation:
             partner=request.partner
         ):
             assistant_response += chunk
-            yield f"data: {json.dumps({'content': chunk})}\n\n"
-        
-        # Save assistant message to database
-        assistant_message = ChatMessage(
-            project_id=project_id,
-            role="assistant",
-            content=assistant_response,
-            model=request.model
-        )
-        db.add(assistant_message)
-        db.commit()
+            yield _SSE_DATA + orjson.dumps({"content": chunk}) + _SSE_END
         
-        yield "data: [DONE]\n\n"
+        stream_completed = True
+        yield _SSE_DONE
     
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(generate(), media_type="text/event-stream", background=background_tasks)
 
 # Ghost suggestion endpoint
 @app.post("/api/projects/{project_id}/ghost-suggest")
 async def ghost_suggest(
     project_id: int,
     request: GhostSuggestionRequest,
+    no_cache: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Generate ghost-writing suggestions"""
     # Verify project ownership
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    await asyncio.to_thread(verify_project_ownership, db, project_id, current_user.id)
     
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    cache_collection = SemanticCache.collection_name(current_user.id, project_id)
+    cache_scope = {"kind": "ghost", "purpose": request.purpose, "model": request.model}
+    cache_query = request.text[:request.cursor_position][-500:]
+    cache_embedding = None
+    if not no_cache:
+        cached_suggestion, cache_embedding = await semantic_cache.lookup_cached(cache_collection, cache_query, cache_scope)
+        if cached_suggestion is not None:
+            return {"suggestion": cached_suggestion}
     
     suggestion = await openrouter.get_ghost_suggestion(
         text=request.text,
@@ -597,6 +924,8 @@ async def ghost_suggest(
         purpose=request.purpose,
         model=request.model
     )
+    if not no_cache:
+        await asyncio.to_thread(semantic_cache.remember, cache_collection, cache_query, cache_scope, cache_embedding, suggestion)
     return {"suggestion": suggestion}
 
 # Memory endpoints
@@ -604,20 +933,14 @@ async def ghost_suggest(
 async def add_memory(
     project_id: int,
     request: MemoryRequest,
+    collection_name: str = Depends(project_collection),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Add content to vector memory"""
     # Verify project ownership
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    await asyncio.to_thread(verify_project_ownership, db, project_id, current_user.id)
     
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    collection_name = f"user_{current_user.id}_project_{project_id}"
     if vector_service:
         await vector_service.add_memory(collection_name, request.content)
     return {"status": "success", "message": "Memory added"}
@@ -626,93 +949,125 @@ async def add_memory(
 async def search_memory(
     project_id: int,
     request: SearchMemoryRequest,
+    collection_name: str = Depends(project_collection),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Search vector memory"""
     # Verify project ownership
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    await asyncio.to_thread(verify_project_ownership, db, project_id, current_user.id)
     
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    collection_name = f"user_{current_user.id}_project_{project_id}"
     if not vector_service:
         raise HTTPException(status_code=503, detail="Vector service unavailable")
     results = await vector_service.search(collection_name, request.query, request.top_k)
     return {"results": results}
 
 # File upload endpoints
+async def _process_upload(
+    file_id: int,
+    file_path: str,
+    filename: str,
+    collection_name: str,
+    file_type: str,
+    content: Optional[str] = None
+):
+    """Extract and index an uploaded file, then mark its record processed (runs as a background task)"""
+    if not (vector_service and vector_service.enabled):
+        print(f"⚠️  Vector service not available - file '{filename}' saved but not indexed")
+        return
+    
+    try:
+        if content is None:
+            content = await file_service.extract_text(file_path)
+        
+        # Add ALL uploaded files to vector store (both train and context)
+        # The difference is just metadata, not whether they're indexed
+        print(f"📤 Adding file '{filename}' to vector store as {file_type} (collection: {collection_name})")
+        await vector_service.add_memory(
+            collection_name,
+            content,
+            metadata={"source": filename, "type": file_type}
+        )
+        print(f"✅ File '{filename}' added to vector store successfully")
+    except Exception as e:
+        print(f"❌ Could not add to vector store: {e}")
+        import traceback
+        traceback.print_exc()
+        return
+    
+    # Only mark as processed if vector service actually worked
+    await asyncio.to_thread(_mark_upload_processed, file_id)
+
+def _mark_upload_processed(file_id: int):
+    db = SessionLocal()
+    try:
+        db.query(FileUpload).filter(FileUpload.id == file_id).update({"processed": True})
+        db.commit()
+    finally:
+        db.close()
+
 @app.post("/api/projects/{project_id}/upload/file")
 async def upload_file(
     project_id: int,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     train: bool = True,
+    collection_name: str = Depends(project_collection),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Upload files - either for training (adds to vector memory) or as context (reference only)"""
     try:
         # Verify project ownership
-        project = db.query(Project).filter(
-            Project.id == project_id,
-            Project.user_id == current_user.id
-        ).first()
+        await asyncio.to_thread(verify_project_ownership, db, project_id, current_user.id)
         
-        if not project:
-            raise HTTPException(status_code=404, detail="Project not found")
+        # Reject names the file_uploads columns can't hold before writing anything
+        if len(file.filename or "") > FILENAME_MAX_LENGTH:
+            raise HTTPException(status_code=422, detail=f"Filename longer than {FILENAME_MAX_LENGTH} characters")
+        if len(file.content_type or "") > MIME_TYPE_MAX_LENGTH:
+            raise HTTPException(status_code=422, detail=f"Content type longer than {MIME_TYPE_MAX_LENGTH} characters")
         
         # Save file with user/project scoping
         user_project_path = f"{current_user.id}/{project_id}"
-        file_path = await file_service.save_upload(user_project_path, file)
-        
-        # Extract text content
-        content = await file_service.extract_text(file_path)
+        file_path, file_size = await file_service.save_upload(user_project_path, file)
         
-        # Add ALL uploaded files to vector store (both train and context)
-        # The difference is just metadata, not whether they're indexed
-        processed_successfully = False
-        if vector_service and vector_service.enabled:
-            try:
-                collection_name = f"user_{current_user.id}_project_{project_id}"
-                file_type = "training" if train else "context"
-                print(f"📤 Adding file '{file.filename}' to vector store as {file_type} (collection: {collection_name})")
-                await vector_service.add_memory(
-                    collection_name, 
-                    content, 
-                    metadata={"source": file.filename, "type": file_type}
-                )
-                processed_successfully = True
-                print(f"✅ File '{file.filename}' added to vector store successfully")
-            except Exception as e:
-                print(f"❌ Could not add to vector store: {e}")
-                import traceback
-                traceback.print_exc()
-                # Continue anyway - file is still saved
-        else:
-            print(f"⚠️  Vector service not available - file '{file.filename}' saved but not indexed")
+        # Context files are returned to the client, so only they are extracted up front
+        content = await file_service.extract_text(file_path) if not train else None
         
-        # Save file record to database
+        # Save file record to database; indexing happens after the response is sent
         file_record = FileUpload(
             project_id=project_id,
             filename=file.filename,
             filepath=file_path,
-            file_size=os.path.getsize(file_path),
+            file_size=file_size,
             mime_type=file.content_type,
-            processed=processed_successfully  # Only mark as processed if vector service actually worked
+            processed=False
+        )
+        
+        def save_record():
+            db.add(file_record)
+            db.commit()
+            return file_record.id
+        file_id = await asyncio.to_thread(save_record)
+        
+        background_tasks.add_task(
+            _process_upload,
+            file_id,
+            file_path,
+            file.filename,
+            collection_name,
+            "training" if train else "context",
+            content
         )
-        db.add(file_record)
-        db.commit()
         
         return {
             "status": "success",
+            "id": file_id,
             "filename": file.filename,
             "path": file_path,
-            "size": os.path.getsize(file_path),
-            "trained": train and vector_service is not None,
+            "size": file_size,
+            "trained": train and vector_service is not None and vector_service.enabled,
+            "processed": False,
             "content": content  # Return content for context files
         }
     except HTTPException:
@@ -723,61 +1078,91 @@ async def upload_file(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@app.get("/api/projects/{project_id}/upload/file/{file_id}/status")
+def get_upload_status(
+    project_id: int,
+    file_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Check whether an uploaded file has been indexed into vector memory"""
+    processed = db.execute(
+        _OWNED_UPLOAD_PROCESSED_STMT,
+        {"file_id": file_id, "project_id": project_id, "user_id": current_user.id}
+    ).scalar_one_or_none()
+    
+    if processed is None:
+        verify_project_ownership(db, project_id, current_user.id)
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    return {"id": file_id, "processed": bool(processed)}
+
+@app.get("/api/projects/{project_id}/upload/file/{file_id}/download")
+def download_upload(
+    project_id: int,
+    file_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download an uploaded file; the body is streamed from disk, never read into memory"""
+    file_record = db.execute(
+        _OWNED_UPLOAD_STMT,
+        {"file_id": file_id, "project_id": project_id, "user_id": current_user.id}
+    ).scalar_one_or_none()
+    
+    if not file_record:
+        verify_project_ownership(db, project_id, current_user.id)
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    if not os.path.isfile(file_record.filepath):
+        raise HTTPException(status_code=404, detail="File missing from storage")
+    
+    return FileResponse(
+        file_record.filepath,
+        filename=file_record.filename,
+        media_type=file_record.mime_type or "application/octet-stream"
+    )
+
 @app.get("/api/projects/{project_id}/upload/list")
-async def list_uploads(
+def list_uploads(
     project_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """List uploaded files for a project"""
-    # Verify project ownership
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
-    
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    rows = db.execute(
+        select(
+            FileUpload.id,
+            FileUpload.filename,
+            FileUpload.file_size,
+            FileUpload.mime_type,
+            FileUpload.processed,
+            FileUpload.created_at
+        )
+        .join(Project, FileUpload.project_id == Project.id)
+        .where(Project.id == project_id, Project.user_id == current_user.id)
+    ).all()
     
-    files = db.query(FileUpload).filter(FileUpload.project_id == project_id).all()
+    if not rows:
+        verify_project_ownership(db, project_id, current_user.id)
     
-    return {
-        "files": [
-            {
-                "id": f.id,
-                "filename": f.filename,
-                "file_size": f.file_size,
-                "mime_type": f.mime_type,
-                "processed": f.processed,
-                "created_at": f.created_at.isoformat()
-            }
-            for f in files
-        ]
-    }
+    return ORJSONResponse({"files": [dict(r._mapping) for r in rows]})
 
 @app.delete("/api/projects/{project_id}/upload/file/{file_id}")
-async def delete_upload(
+def delete_upload(
     project_id: int,
     file_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete an uploaded file"""
-    # Verify project ownership
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
-    
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    file_record = db.query(FileUpload).filter(
-        FileUpload.id == file_id,
-        FileUpload.project_id == project_id
-    ).first()
+    file_record = db.execute(
+        _OWNED_UPLOAD_STMT,
+        {"file_id": file_id, "project_id": project_id, "user_id": current_user.id}
+    ).scalar_one_or_none()
     
     if not file_record:
+        verify_project_ownership(db, project_id, current_user.id)
         raise HTTPException(status_code=404, detail="File not found")
     
     # Delete physical file
@@ -794,88 +1179,47 @@ async def delete_upload(
 @app.get("/api/models")
 async def get_models():
     """Get list of available LLM models"""
-    return {
-        "models": [
-            {
-                "id": "anthropic/claude-3.5-sonnet",
-                "name": "Claude 3.5 Sonnet",
-                "provider": "Anthropic",
-                "context_length": 200000
-            },
-            {
-                "id": "x-ai/grok-4.1-fast",
-                "name": "Grok 4.1 Fast",
-                "provider": "xAI",
-                "context_length": 131072
-            },
-            {
-                "id": "deepseek/deepseek-v3.2",
-                "name": "DeepSeek v3.2",
-                "provider": "DeepSeek",
-                "context_length": 64000
-            },
-            {
-                "id": "openai/gpt-oss-120b",
-                "name": "GPT-OSS-120B",
-                "provider": "OpenAI",
-                "context_length": 128000
-            },
-            {
-                "id": "google/gemini-2.5-flash",
-                "name": "Gemini 2.5 Flash",
-                "provider": "Google",
-                "context_length": 1000000
-            }
-        ]
-    }
+    return Response(content=_MODELS_JSON, media_type="application/json")
 
 # ==================== STORY ENGINE ROUTES ====================
 
 @app.get("/api/stories")
-async def get_user_stories(
+def get_user_stories(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get all stories for the current user"""
-    stories = story_service.get_user_stories(db, current_user.id)
-    return {
-        "stories": [
-            {
-                "id": s.id,
-                "title": s.title,
-                "description": s.description,
-                "created_at": s.created_at.isoformat(),
-                "updated_at": s.updated_at.isoformat()
-            }
-            for s in stories
-        ]
-    }
+    rows = db.execute(
+        select(Story.id, Story.title, Story.description, Story.created_at, Story.updated_at)
+        .where(Story.user_id == current_user.id)
+    ).all()
+    return ORJSONResponse({"stories": [dict(r._mapping) for r in rows]})
 
 @app.post("/api/stories")
-async def create_story(
+def create_story(
     request: StoryCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new story"""
     story = story_service.create_story(db, current_user.id, request.title, request.description)
-    return {
+    return ORJSONResponse({
         "story": {
             "id": story.id,
             "title": story.title,
             "description": story.description,
-            "created_at": story.created_at.isoformat()
+            "created_at": story.created_at
         }
-    }
+    })
 
 @app.get("/api/stories/{story_id}")
-async def get_story(
+def get_story(
     story_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a story with all its chapters and characters"""
-    story = story_service.get_story(db, story_id, current_user.id)
+    story = story_service.get_story_with_children(db, story_id, current_user.id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
     
@@ -906,8 +1250,44 @@ async def get_story(
         }
     }
 
+@app.get("/api/stories/{story_id}/outline")
+def get_story_outline(
+    story_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a story's chapter and character metadata without chapter text or backstories"""
+    story = story_service.get_story_outline(db, story_id, current_user.id)
+    if not story:
+        raise HTTPException(status_code=404, detail="Story not found")
+    
+    return {
+        "story": {
+            "id": story.id,
+            "title": story.title,
+            "description": story.description,
+            "chapters": [
+                {
+                    "id": c.id,
+                    "title": c.title,
+                    "summary": c.summary,
+                    "order": c.order
+                }
+                for c in story.chapters
+            ],
+            "characters": [
+                {
+                    "id": char.id,
+                    "name": char.name,
+                    "traits": char.traits
+                }
+                for char in story.characters
+            ]
+        }
+    }
+
 @app.put("/api/stories/{story_id}")
-async def update_story(
+def update_story(
     story_id: int,
     request: StoryUpdate,
     current_user: User = Depends(get_current_user),
@@ -921,7 +1301,7 @@ async def update_story(
     return {"story": {"id": story.id, "title": story.title, "description": story.description}}
 
 @app.delete("/api/stories/{story_id}")
-async def delete_story(
+def delete_story(
     story_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -935,7 +1315,7 @@ async def delete_story(
 
 # Chapter routes
 @app.post("/api/stories/{story_id}/chapters")
-async def create_chapter(
+def create_chapter(
     story_id: int,
     request: ChapterCreate,
     current_user: User = Depends(get_current_user),
@@ -943,29 +1323,21 @@ async def create_chapter(
 ):
     """Create a new chapter in a story"""
     # Verify story ownership
-    story = story_service.get_story(db, story_id, current_user.id)
-    if not story:
+    if not story_service.authorize_story(db, story_id, current_user.id):
         raise HTTPException(status_code=404, detail="Story not found")
     
     chapter = story_service.create_chapter(db, story_id, request.title, request.text)
     return {"chapter": {"id": chapter.id, "title": chapter.title, "text": chapter.text}}
 
 @app.put("/api/chapters/{chapter_id}")
-async def update_chapter(
+def update_chapter(
     chapter_id: int,
     request: ChapterUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a chapter"""
-    chapter = story_service.get_chapter(db, chapter_id)
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    # Verify ownership through story
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
+    authorize_chapter(db, chapter_id, current_user.id)
     
     updated_chapter = story_service.update_chapter(db, chapter_id, **request.dict(exclude_unset=True))
     return {
@@ -977,25 +1349,8 @@ async def update_chapter(
         }
     }
 
-@app.post("/api/chapters/{chapter_id}/summarize")
-async def summarize_chapter(
-    chapter_id: int,
-    request: ChapterSummarizeRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Summarize chapter text using Gemini"""
-    chapter = story_service.get_chapter(db, chapter_id)
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    # Verify ownership through story
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    # Default summarization prompt
-    default_prompt = """Summarize the provided text passage:
+# Default chapter summarization prompt
+_DEFAULT_SUMMARY_PROMPT: Final[str] = """Summarize the provided text passage:
 
 REQUIREMENTS:
 - Maximum length: 5 paragraphs
@@ -1011,21 +1366,74 @@ CRITICAL GUIDELINES:
 - Capture the most significant events and interactions
 - Maintain a clear, factual tone
 - Ensure comprehensive coverage within the paragraph limit"""
+
+# The chapter's stored AI summary, if it was generated from the same text and prompt
+_GENERATED_SUMMARY_STMT = select(Chapter.generated_summary).where(
+    Chapter.id == bindparam("chapter_id"),
+    Chapter.generated_summary_hash == bindparam("source_hash")
+)
+
+def _load_generated_summary(db: Session, chapter_id: int, source_hash: str) -> Optional[str]:
+    return db.execute(
+        _GENERATED_SUMMARY_STMT, {"chapter_id": chapter_id, "source_hash": source_hash}
+    ).scalar_one_or_none()
+
+def _store_generated_summary(db: Session, chapter_id: int, source_hash: str, summary: str):
+    db.execute(
+        update(Chapter)
+        .where(Chapter.id == chapter_id)
+        # Not an edit to the chapter, so leave updated_at alone
+        .values(generated_summary=summary, generated_summary_hash=source_hash, updated_at=Chapter.updated_at)
+    )
+    db.commit()
+
+@app.post("/api/chapters/{chapter_id}/summarize")
+async def summarize_chapter(
+    chapter_id: int,
+    request: ChapterSummarizeRequest,
+    no_cache: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Summarize chapter text using Gemini"""
+    await asyncio.to_thread(authorize_chapter, db, chapter_id, current_user.id)
     
-    prompt = request.prompt if request.prompt else default_prompt
+    prompt = request.prompt or _DEFAULT_SUMMARY_PROMPT
+    source_hash = SemanticCache.content_hash(f"{prompt}\0{request.text}")
     
     # Use Gemini for summarization
-    summary = await openrouter.summarize_text(
-        text=request.text,
-        prompt=prompt,
-        model="google/gemini-2.5-flash"
-    )
+    async def generate() -> str:
+        summary = await openrouter.summarize_text(
+            text=request.text,
+            prompt=prompt,
+            model="google/gemini-2.5-flash"
+        )
+        if summary.strip():
+            await asyncio.to_thread(_store_generated_summary, db, chapter_id, source_hash, summary)
+        return summary
+    
+    async def summarize() -> str:
+        # Unchanged text re-summarized with the same prompt: reuse the stored summary
+        stored = await asyncio.to_thread(_load_generated_summary, db, chapter_id, source_hash)
+        return stored if stored is not None else await generate()
+    
+    if no_cache:
+        summary = await generate()
+    else:
+        # A summary must match the exact text, so only identical requests hit
+        summary = await semantic_cache.get_or_compute(
+            SemanticCache.user_collection_name(current_user.id),
+            request.text,
+            {"kind": "summary", "prompt": SemanticCache.content_hash(prompt), "model": "google/gemini-2.5-flash"},
+            summarize,
+            semantic=False
+        )
     
     return {"summary": summary}
 
 # Character routes
 @app.post("/api/stories/{story_id}/characters")
-async def create_character(
+def create_character(
     story_id: int,
     request: CharacterCreate,
     current_user: User = Depends(get_current_user),
@@ -1033,8 +1441,7 @@ async def create_character(
 ):
     """Create a new character in a story"""
     # Verify story ownership
-    story = story_service.get_story(db, story_id, current_user.id)
-    if not story:
+    if not story_service.authorize_story(db, story_id, current_user.id):
         raise HTTPException(status_code=404, detail="Story not found")
     
     character = story_service.create_character(db, story_id, request.name, request.traits, request.backstory)
@@ -1047,33 +1454,49 @@ async def create_character(
         }
     }
 
-@app.get("/api/stories/{story_id}/characters")
-async def get_characters(
+@app.post("/api/stories/{story_id}/characters/bulk")
+def create_characters_bulk(
     story_id: int,
+    request: List[CharacterCreate],
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all characters for a story"""
-    # Verify story ownership
-    story = story_service.get_story(db, story_id, current_user.id)
-    if not story:
+    """Create several characters in a story in one transaction"""
+    if not story_service.authorize_story(db, story_id, current_user.id):
         raise HTTPException(status_code=404, detail="Story not found")
     
-    characters = db.query(Character).filter(Character.story_id == story_id).all()
+    characters = story_service.create_characters(db, story_id, [c.dict() for c in request])
     return {
         "characters": [
             {
-                "id": c.id,
-                "name": c.name,
-                "traits": c.traits,
-                "backstory": c.backstory
+                "id": char.id,
+                "name": char.name,
+                "traits": char.traits,
+                "backstory": char.backstory
             }
-            for c in characters
+            for char in characters
         ]
     }
 
+@app.get("/api/stories/{story_id}/characters")
+def get_characters(
+    story_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get all characters for a story"""
+    # Verify story ownership
+    if not story_service.authorize_story(db, story_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Story not found")
+    
+    rows = db.execute(
+        select(Character.id, Character.name, Character.traits, Character.backstory)
+        .where(Character.story_id == story_id)
+    ).all()
+    return ORJSONResponse({"characters": [dict(r._mapping) for r in rows]})
+
 @app.put("/api/stories/{story_id}/characters/{char_id}")
-async def update_character(
+def update_character(
     story_id: int,
     char_id: int,
     request: CharacterCreate,
@@ -1081,121 +1504,120 @@ async def update_character(
     db: Session = Depends(get_db)
 ):
     """Update a character"""
-    # Verify story ownership
-    story = story_service.get_story(db, story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=404, detail="Story not found")
-    
-    character = db.query(Character).filter(Character.id == char_id, Character.story_id == story_id).first()
-    if not character:
-        raise HTTPException(status_code=404, detail="Character not found")
-    
+    values = {}
     if request.name:
-        character.name = request.name
+        values["name"] = request.name
     if request.traits is not None:
-        character.traits = request.traits
+        values["traits"] = request.traits
     if request.backstory is not None:
-        character.backstory = request.backstory
+        values["backstory"] = request.backstory
     
-    db.commit()
-    db.refresh(character)
+    character = _update_returning(
+        db, Character,
+        owned_character_criteria(char_id, story_id, current_user.id),
+        values,
+        (Character.id, Character.name, Character.traits, Character.backstory)
+    )
+    if not character:
+        if not story_service.authorize_story(db, story_id, current_user.id):
+            raise HTTPException(status_code=404, detail="Story not found")
+        raise HTTPException(status_code=404, detail="Character not found")
     
-    return {
-        "character": {
-            "id": character.id,
-            "name": character.name,
-            "traits": character.traits,
-            "backstory": character.backstory
-        }
-    }
+    return ORJSONResponse({"character": dict(character._mapping)})
 
 @app.delete("/api/stories/{story_id}/characters/{char_id}")
-async def delete_character(
+def delete_character(
     story_id: int,
     char_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a character"""
-    # Verify story ownership
-    story = story_service.get_story(db, story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=404, detail="Story not found")
-    
-    character = db.query(Character).filter(Character.id == char_id, Character.story_id == story_id).first()
-    if not character:
+    result = db.execute(
+        delete(Character)
+        .where(*owned_character_criteria(char_id, story_id, current_user.id))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        if not story_service.authorize_story(db, story_id, current_user.id):
+            raise HTTPException(status_code=404, detail="Story not found")
         raise HTTPException(status_code=404, detail="Character not found")
-    
-    db.delete(character)
     db.commit()
     
     return {"message": "Character deleted"}
 
 # Beat/Scene routes
 @app.post("/api/chapters/{chapter_id}/beats")
-async def create_beat(
+def create_beat(
     chapter_id: int,
     request: BeatSceneCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new beat/scene in a chapter"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
+    authorize_chapter(db, chapter_id, current_user.id)
     
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    beat = BeatScene(
-        chapter_id=chapter_id,
-        description=request.description,
-        order=request.order
-    )
-    db.add(beat)
+    # INSERT ... RETURNING id; the response echoes the request, so no re-select
+    beat_id = db.execute(
+        insert(BeatScene).returning(BeatScene.id),
+        {"chapter_id": chapter_id, "description": request.description, "order": request.order}
+    ).scalar_one()
     db.commit()
-    db.refresh(beat)
     
     return {
         "beat": {
-            "id": beat.id,
-            "description": beat.description,
-            "order": beat.order
+            "id": beat_id,
+            "description": request.description,
+            "order": request.order
         }
     }
 
-@app.get("/api/chapters/{chapter_id}/beats")
-async def get_beats(
+@app.post("/api/chapters/{chapter_id}/beats/bulk")
+def create_beats_bulk(
     chapter_id: int,
+    request: List[BeatSceneCreate],
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all beats/scenes for a chapter"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
+    """Create several beats/scenes in a chapter in one transaction"""
+    authorize_chapter(db, chapter_id, current_user.id)
     
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
+    if not request:
+        return {"beats": []}
+    
+    # One multi-row INSERT ... RETURNING and a single commit, instead of one per beat
+    beat_ids = db.execute(
+        insert(BeatScene).returning(BeatScene.id, sort_by_parameter_order=True),
+        [{"chapter_id": chapter_id, "description": b.description, "order": b.order} for b in request]
+    ).scalars().all()
+    db.commit()
     
-    beats = db.query(BeatScene).filter(BeatScene.chapter_id == chapter_id).order_by(BeatScene.order).all()
     return {
         "beats": [
-            {
-                "id": b.id,
-                "description": b.description,
-                "order": b.order
-            }
-            for b in beats
+            {"id": beat_id, "description": b.description, "order": b.order}
+            for beat_id, b in zip(beat_ids, request)
         ]
     }
 
+@app.get("/api/chapters/{chapter_id}/beats")
+def get_beats(
+    chapter_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get all beats/scenes for a chapter"""
+    authorize_chapter(db, chapter_id, current_user.id)
+    
+    rows = db.execute(
+        select(BeatScene.id, BeatScene.description, BeatScene.order)
+        .where(BeatScene.chapter_id == chapter_id)
+        .order_by(BeatScene.order)
+    ).all()
+    return ORJSONResponse({"beats": [dict(r._mapping) for r in rows]})
+
 @app.put("/api/chapters/{chapter_id}/beats/{beat_id}")
-async def update_beat(
+def update_beat(
     chapter_id: int,
     beat_id: int,
     request: BeatSceneCreate,
@@ -1203,51 +1625,34 @@ async def update_beat(
     db: Session = Depends(get_db)
 ):
     """Update a beat/scene"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    beat = db.query(BeatScene).filter(BeatScene.id == beat_id, BeatScene.chapter_id == chapter_id).first()
-    if not beat:
-        raise HTTPException(status_code=404, detail="Beat not found")
+    authorize_chapter(db, chapter_id, current_user.id)
     
+    values = {}
     if request.description:
-        beat.description = request.description
+        values["description"] = request.description
     if request.order is not None:
-        beat.order = request.order
+        values["order"] = request.order
     
-    db.commit()
-    db.refresh(beat)
+    beat = _update_returning(
+        db, BeatScene,
+        (BeatScene.id == beat_id, BeatScene.chapter_id == chapter_id),
+        values,
+        (BeatScene.id, BeatScene.description, BeatScene.order)
+    )
+    if not beat:
+        raise HTTPException(status_code=404, detail="Beat not found")
     
-    return {
-        "beat": {
-            "id": beat.id,
-            "description": beat.description,
-            "order": beat.order
-        }
-    }
+    return ORJSONResponse({"beat": dict(beat._mapping)})
 
 @app.delete("/api/chapters/{chapter_id}/beats/{beat_id}")
-async def delete_beat(
+def delete_beat(
     chapter_id: int,
     beat_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a beat/scene"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
+    authorize_chapter(db, chapter_id, current_user.id)
     
     beat = db.query(BeatScene).filter(BeatScene.id == beat_id, BeatScene.chapter_id == chapter_id).first()
     if not beat:
@@ -1260,69 +1665,46 @@ async def delete_beat(
 
 # World Building routes
 @app.post("/api/chapters/{chapter_id}/worldbuilding")
-async def create_world_element(
+def create_world_element(
     chapter_id: int,
     request: WorldBuildingCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new world building element in a chapter"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
+    authorize_chapter(db, chapter_id, current_user.id)
     
-    element = WorldBuildingElement(
-        chapter_id=chapter_id,
-        category=request.category,
-        description=request.description
-    )
-    db.add(element)
+    element_id = db.execute(
+        insert(WorldBuildingElement).returning(WorldBuildingElement.id),
+        {"chapter_id": chapter_id, "category": request.category, "description": request.description}
+    ).scalar_one()
     db.commit()
-    db.refresh(element)
     
     return {
         "element": {
-            "id": element.id,
-            "category": element.category,
-            "description": element.description
+            "id": element_id,
+            "category": request.category,
+            "description": request.description
         }
     }
 
 @app.get("/api/chapters/{chapter_id}/worldbuilding")
-async def get_world_elements(
+def get_world_elements(
     chapter_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get all world building elements for a chapter"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
+    authorize_chapter(db, chapter_id, current_user.id)
     
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    elements = db.query(WorldBuildingElement).filter(WorldBuildingElement.chapter_id == chapter_id).all()
-    return {
-        "elements": [
-            {
-                "id": e.id,
-                "category": e.category,
-                "description": e.description
-            }
-            for e in elements
-        ]
-    }
+    rows = db.execute(
+        select(WorldBuildingElement.id, WorldBuildingElement.category, WorldBuildingElement.description)
+        .where(WorldBuildingElement.chapter_id == chapter_id)
+    ).all()
+    return ORJSONResponse({"elements": [dict(r._mapping) for r in rows]})
 
 @app.put("/api/chapters/{chapter_id}/worldbuilding/{elem_id}")
-async def update_world_element(
+def update_world_element(
     chapter_id: int,
     elem_id: int,
     request: WorldBuildingCreate,
@@ -1330,54 +1712,34 @@ async def update_world_element(
     db: Session = Depends(get_db)
 ):
     """Update a world building element"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    element = db.query(WorldBuildingElement).filter(
-        WorldBuildingElement.id == elem_id,
-        WorldBuildingElement.chapter_id == chapter_id
-    ).first()
-    if not element:
-        raise HTTPException(status_code=404, detail="World element not found")
+    authorize_chapter(db, chapter_id, current_user.id)
     
+    values = {}
     if request.category:
-        element.category = request.category
+        values["category"] = request.category
     if request.description:
-        element.description = request.description
+        values["description"] = request.description
     
-    db.commit()
-    db.refresh(element)
+    element = _update_returning(
+        db, WorldBuildingElement,
+        (WorldBuildingElement.id == elem_id, WorldBuildingElement.chapter_id == chapter_id),
+        values,
+        (WorldBuildingElement.id, WorldBuildingElement.category, WorldBuildingElement.description)
+    )
+    if not element:
+        raise HTTPException(status_code=404, detail="World element not found")
     
-    return {
-        "element": {
-            "id": element.id,
-            "category": element.category,
-            "description": element.description
-        }
-    }
+    return ORJSONResponse({"element": dict(element._mapping)})
 
 @app.delete("/api/chapters/{chapter_id}/worldbuilding/{elem_id}")
-async def delete_world_element(
+def delete_world_element(
     chapter_id: int,
     elem_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a world building element"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
+    authorize_chapter(db, chapter_id, current_user.id)
     
     element = db.query(WorldBuildingElement).filter(
         WorldBuildingElement.id == elem_id,
@@ -1393,69 +1755,47 @@ async def delete_world_element(
 
 # Key Events routes
 @app.post("/api/chapters/{chapter_id}/keyevents")
-async def create_key_event(
+def create_key_event(
     chapter_id: int,
     request: KeyEventCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new key event in a chapter"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
+    authorize_chapter(db, chapter_id, current_user.id)
     
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    event = KeyEvent(
-        chapter_id=chapter_id,
-        description=request.description,
-        order=request.order
-    )
-    db.add(event)
+    event_id = db.execute(
+        insert(KeyEvent).returning(KeyEvent.id),
+        {"chapter_id": chapter_id, "description": request.description, "order": request.order}
+    ).scalar_one()
     db.commit()
-    db.refresh(event)
     
     return {
         "event": {
-            "id": event.id,
-            "description": event.description,
-            "order": event.order
+            "id": event_id,
+            "description": request.description,
+            "order": request.order
         }
     }
 
 @app.get("/api/chapters/{chapter_id}/keyevents")
-async def get_key_events(
+def get_key_events(
     chapter_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get all key events for a chapter"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
+    authorize_chapter(db, chapter_id, current_user.id)
     
-    events = db.query(KeyEvent).filter(KeyEvent.chapter_id == chapter_id).order_by(KeyEvent.order).all()
-    return {
-        "events": [
-            {
-                "id": e.id,
-                "description": e.description,
-                "order": e.order
-            }
-            for e in events
-        ]
-    }
+    rows = db.execute(
+        select(KeyEvent.id, KeyEvent.description, KeyEvent.order)
+        .where(KeyEvent.chapter_id == chapter_id)
+        .order_by(KeyEvent.order)
+    ).all()
+    return ORJSONResponse({"events": [dict(r._mapping) for r in rows]})
 
 @app.put("/api/chapters/{chapter_id}/keyevents/{event_id}")
-async def update_key_event(
+def update_key_event(
     chapter_id: int,
     event_id: int,
     request: KeyEventCreate,
@@ -1463,51 +1803,34 @@ async def update_key_event(
     db: Session = Depends(get_db)
 ):
     """Update a key event"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    event = db.query(KeyEvent).filter(KeyEvent.id == event_id, KeyEvent.chapter_id == chapter_id).first()
-    if not event:
-        raise HTTPException(status_code=404, detail="Key event not found")
+    authorize_chapter(db, chapter_id, current_user.id)
     
+    values = {}
     if request.description:
-        event.description = request.description
+        values["description"] = request.description
     if request.order is not None:
-        event.order = request.order
+        values["order"] = request.order
     
-    db.commit()
-    db.refresh(event)
+    event = _update_returning(
+        db, KeyEvent,
+        (KeyEvent.id == event_id, KeyEvent.chapter_id == chapter_id),
+        values,
+        (KeyEvent.id, KeyEvent.description, KeyEvent.order)
+    )
+    if not event:
+        raise HTTPException(status_code=404, detail="Key event not found")
     
-    return {
-        "event": {
-            "id": event.id,
-            "description": event.description,
-            "order": event.order
-        }
-    }
+    return ORJSONResponse({"event": dict(event._mapping)})
 
 @app.delete("/api/chapters/{chapter_id}/keyevents/{event_id}")
-async def delete_key_event(
+def delete_key_event(
     chapter_id: int,
     event_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a key event"""
-    # Verify chapter ownership through story
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-    if not chapter:
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
-    story = story_service.get_story(db, chapter.story_id, current_user.id)
-    if not story:
-        raise HTTPException(status_code=403, detail="Access denied")
+    authorize_chapter(db, chapter_id, current_user.id)
     
     event = db.query(KeyEvent).filter(KeyEvent.id == event_id, KeyEvent.chapter_id == chapter_id).first()
     if not event:
@@ -1521,47 +1844,70 @@ async def delete_key_event(
 # AI Generation routes
 @app.post("/api/ai/generate")
 async def generate_ai_content(
-    request: dict,
+    request: AIGenerateInlineRequest,
+    no_cache: bool = False,
     current_user: User = Depends(get_current_user)
 ):
-    """Generate AI content for story writing (prose or beat expansion)"""
-    prompt = request.get('prompt', '')
-    content_type = request.get('type', 'prose')
-    model = request.get('model', 'deepseek/deepseek-chat-v3.1')  # Accept model from request
-    
-    if not prompt:
-        raise HTTPException(status_code=400, detail="Prompt is required")
+    """
+    Generate AI content for story writing (prose or beat expansion).
+    With "stream": true the content is sent as server-sent events as it's
+    generated; otherwise it's returned in one JSON body once complete.
+    """
+    prompt = request.prompt
+    content_type = request.type
+    model = request.model
+    
+    cache_collection = SemanticCache.user_collection_name(current_user.id)
+    cache_scope = {"kind": "generate", "type": content_type, "model": model}
+    # Some models need explicit max_tokens
+    max_tokens = 4000 if "deepseek" in model.lower() or "gemini" in model.lower() else None
+    
+    if request.stream:
+        cached_content, cache_embedding = None, None
+        if not no_cache:
+            cached_content, cache_embedding = await semantic_cache.lookup_cached(cache_collection, prompt, cache_scope)
+        if cached_content is not None:
+            # Nothing to stream; answer in one JSON body like the non-streaming form
+            return ORJSONResponse({"content": cached_content, "type": content_type, "model": model})
+        
+        async def generate():
+            content = ""
+            try:
+                async for chunk in openrouter.stream_prompt(prompt, model, max_tokens):
+                    content += chunk
+                    yield _SSE_DATA + orjson.dumps({"content": chunk}) + _SSE_END
+            except Exception as e:
+                print(f"ERROR: AI generation stream failed for model {model}: {e}")
+                yield _SSE_DATA + orjson.dumps({"error": f"AI generation failed: {e}"}) + _SSE_END
+                return
+            
+            if not no_cache:
+                await asyncio.to_thread(semantic_cache.remember, cache_collection, prompt, cache_scope, cache_embedding, content)
+            yield _SSE_DONE
+        
+        return StreamingResponse(generate(), media_type="text/event-stream")
     
     try:
-        import httpx
-        import os
-        
-        OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-        if not OPENROUTER_API_KEY:
+        if not openrouter_api_key:
             raise HTTPException(status_code=500, detail="OpenRouter API key not configured")
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async def call_openrouter() -> str:
             # Prepare the request payload
             payload = {
                 "model": model,
                 "messages": [{"role": "user", "content": prompt}]
             }
             
-            # Some models need explicit max_tokens
-            if "deepseek" in model.lower() or "gemini" in model.lower():
-                payload["max_tokens"] = 4000
+            if max_tokens:
+                payload["max_tokens"] = max_tokens
             
             print(f"Sending request to OpenRouter with model: {model}")  # Debug log
             
+            client = get_http_client()
             response = await client.post(
                 "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": os.getenv("SITE_URL", "http://localhost:8000"),
-                    "X-Title": os.getenv("SITE_NAME", "StoryEngine")
-                },
-                json=payload
+                headers=OPENROUTER_HEADERS,
+                content=orjson.dumps(payload)
             )
             
             if response.status_code != 200:
@@ -1569,14 +1915,20 @@ async def generate_ai_content(
                 print(f"ERROR: {error_detail}")  # Log to Railway logs
                 raise HTTPException(status_code=response.status_code, detail=error_detail)
             
-            data = response.json()
+            data = orjson.loads(response.content)
             
             # Debug logging for Railway
             print(f"OpenRouter response for model {model}: {data}")
             
-            content = data.get('choices', [{}])[0].get('message', {}).get('content', '')
-            
-            return {"content": content, "type": content_type, "model": model}
+            return data.get('choices', [{}])[0].get('message', {}).get('content', '')
+        
+        if no_cache:
+            content = await call_openrouter()
+        else:
+            # Users regenerate near-identical prompts often; reuse earlier answers
+            content = await semantic_cache.get_or_compute(cache_collection, prompt, cache_scope, call_openrouter)
+        
+        return {"content": content, "type": content_type, "model": model}
     
     except HTTPException:
         raise
@@ -1594,99 +1946,76 @@ async def generate_story_content(
 ):
     """Generate story content using AI"""
     
+    def character_name() -> str:
+        return request.context.split("name:")[1].strip() if "name:" in request.context else "Unknown"
+    
     async def generate():
         if request.type == "summary":
             result = await story_service.generate_chapter_summary(request.context)
-            yield f"data: {json.dumps({'content': result})}\n\n"
+            yield _SSE_DATA + orjson.dumps({"content": result}) + _SSE_END
         
         elif request.type == "character":
-            result = await story_service.generate_character_development(
-                request.context.split("name:")[1].strip() if "name:" in request.context else "Unknown",
-                request.context
-            )
-            yield f"data: {json.dumps({'content': result})}\n\n"
+            result = await story_service.generate_character_development(character_name(), request.context)
+            yield _SSE_DATA + orjson.dumps({"content": result}) + _SSE_END
         
         elif request.type == "plot":
             result = await story_service.generate_plot_suggestions(request.context)
-            yield f"data: {json.dumps({'content': result})}\n\n"
+            yield _SSE_DATA + orjson.dumps({"content": result}) + _SSE_END
         
         elif request.type == "beats":
             beats = await story_service.generate_scene_beats(request.context)
-            yield f"data: {json.dumps({'beats': beats})}\n\n"
+            yield _SSE_DATA + orjson.dumps({"beats": beats}) + _SSE_END
+        
+        elif request.type == "chapter":
+            # Summary and beats generated concurrently
+            summary, beats = await story_service.generate_chapter_bundle(request.context)
+            yield _SSE_DATA + orjson.dumps({"content": summary, "beats": beats}) + _SSE_END
+        
+        elif request.type == "character_bundle":
+            # Character development and plot suggestions generated concurrently
+            development, plot = await story_service.generate_character_bundle(character_name(), request.context)
+            yield _SSE_DATA + orjson.dumps({"content": development, "plot": plot}) + _SSE_END
         
         elif request.type == "worldbuilding":
             result = await story_service.generate_world_building(request.category or "General", request.context)
-            yield f"data: {json.dumps({'content': result})}\n\n"
+            yield _SSE_DATA + orjson.dumps({"content": result}) + _SSE_END
     
     return StreamingResponse(generate(), media_type="text/event-stream")
 
 # ==================== END STORY ENGINE ROUTES ====================
 
-@app.get("/api/models")
-async def get_models():
-    """Get available LLM models"""
-    return {
-        "models": [
-            {
-                "id": "anthropic/claude-3.7-sonnet",
-                "name": "Claude 3.7 Sonnet",
-                "provider": "Anthropic",
-                "context_length": 200000
-            },
-            {
-                "id": "x-ai/grok-4.1-fast",
-                "name": "Grok 4.1 Fast",
-                "provider": "xAI",
-                "context_length": 131072
-            },
-            {
-                "id": "deepseek/deepseek-v3.2",
-                "name": "DeepSeek v3.2",
-                "provider": "DeepSeek",
-                "context_length": 64000
-            },
-            {
-                "id": "openai/gpt-oss-120b",
-                "name": "GPT-OSS-120B",
-                "provider": "OpenAI",
-                "context_length": 128000
-            },
-            {
-                "id": "google/gemini-2.5-flash",
-                "name": "Gemini 2.5 Flash",
-                "provider": "Google",
-                "context_length": 1000000
-            }
-        ]
-    }
-
 # Mount static files for production deployment (serve frontend)
 # Static files are mounted AFTER all API routes so API takes precedence
-static_dir = Path(__file__).parent.parent / "dist"
-if static_dir.exists():
-    # Mount assets directory for static files (JS, CSS, images)
-    if (static_dir / "assets").exists():
-        app.mount("/assets", StaticFiles(directory=str(static_dir / "assets")), name="assets")
-    
-    # Catch-all route for SPA - must be last and must not match /api/* routes
-    @app.get("/{full_path:path}", include_in_schema=False)
-    async def serve_spa(full_path: str):
-        """Serve the SPA for all non-API routes"""
+class SPAStaticFiles(StaticFiles):
+    """
+    Serves the built frontend: unknown paths fall back to index.html for
+    client-side routing, and Vite's content-hashed assets are marked
+    immutable so browsers never revalidate them
+    """
+    async def get_response(self, path: str, scope):
         # API routes are handled by FastAPI routes defined above - don't intercept them
-        if full_path.startswith("api"):
+        if path == "api" or path.startswith("api/"):
             raise HTTPException(status_code=404, detail="API endpoint not found")
         
-        # Try to serve the requested file
-        file_path = static_dir / full_path
-        if file_path.is_file():
-            return FileResponse(file_path)
-        
-        # Fall back to index.html for SPA routing
-        index_path = static_dir / "index.html"
-        if index_path.is_file():
-            return FileResponse(index_path)
+        try:
+            response = await super().get_response(path, scope)
+        except StarletteHTTPException as exc:
+            # A missing hashed asset is a real 404, not a client-side route
+            if exc.status_code != 404 or path.startswith("assets/"):
+                raise
+            # Fall back to index.html for SPA routing
+            response = await super().get_response("index.html", scope)
         
-        raise HTTPException(status_code=404, detail="Not found")
+        if path.startswith("assets/"):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            # index.html names the current asset hashes; always revalidate it
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+static_dir = Path(__file__).parent.parent / "dist"
+if static_dir.exists():
+    app.mount("/", SPAStaticFiles(directory=str(static_dir), html=True), name="spa")
 
 if __name__ == "__main__":
     import uvicorn
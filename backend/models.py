@@ -1,17 +1,25 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 
 Base = declarative_base()
 
+# Column lengths that API input is validated against before it reaches an INSERT
+EMAIL_MAX_LENGTH = 254
+USER_NAME_MAX_LENGTH = 100
+PROJECT_NAME_MAX_LENGTH = 200
+MODEL_ID_MAX_LENGTH = 128
+FILENAME_MAX_LENGTH = 512
+MIME_TYPE_MAX_LENGTH = 255
+
 class User(Base):
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, unique=True, index=True, nullable=False)
-    password_hash = Column(String, nullable=False)
-    name = Column(String, nullable=True)
+    email = Column(String(EMAIL_MAX_LENGTH), unique=True, index=True, nullable=False)
+    password_hash = Column(String(255), nullable=False)
+    name = Column(String(USER_NAME_MAX_LENGTH), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -19,10 +27,14 @@ class User(Base):
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        # Ownership checks filter on (id, user_id) together
+        Index("ix_project_id_user_id", "id", "user_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    name = Column(String, nullable=False)
+    name = Column(String(PROJECT_NAME_MAX_LENGTH), nullable=False)
     description = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -35,6 +47,9 @@ class Project(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_document_project", "project_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
@@ -47,12 +62,16 @@ class Document(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Chat history loads a project's most recent messages
+        Index("ix_chat_message_project_created", "project_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    role = Column(String, nullable=False)  # 'user' or 'assistant'
+    role = Column(String(16), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
-    model = Column(String, nullable=True)  # Which model was used
+    model = Column(String(MODEL_ID_MAX_LENGTH), nullable=True)  # Which model was used
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -60,13 +79,16 @@ class ChatMessage(Base):
 
 class FileUpload(Base):
     __tablename__ = "file_uploads"
+    __table_args__ = (
+        Index("ix_file_upload_project", "project_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    filename = Column(String, nullable=False)
-    filepath = Column(String, nullable=False)  # Relative path in storage
+    filename = Column(String(FILENAME_MAX_LENGTH), nullable=False)
+    filepath = Column(String(1024), nullable=False)  # Relative path in storage
     file_size = Column(Integer, nullable=False)  # Size in bytes
-    mime_type = Column(String, nullable=True)
+    mime_type = Column(String(MIME_TYPE_MAX_LENGTH), nullable=True)
     processed = Column(Boolean, default=False)  # Whether it's been added to vector memory
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -76,6 +98,10 @@ class FileUpload(Base):
 # Story Engine Models
 class Story(Base):
     __tablename__ = "stories"
+    __table_args__ = (
+        # Story lists and ownership checks filter on user_id
+        Index("ix_story_user", "user_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -92,6 +118,10 @@ class Story(Base):
 
 class Chapter(Base):
     __tablename__ = "chapters"
+    __table_args__ = (
+        # Chapter lists filter on story_id and sort by order
+        Index("ix_chapter_story_order", "story_id", "order"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     story_id = Column(Integer, ForeignKey("stories.id"), nullable=False)
@@ -99,6 +129,10 @@ class Chapter(Base):
     text = Column(Text, nullable=True)
     summary = Column(Text, nullable=True)
     order = Column(Integer, nullable=True)
+    # Last AI summary and a hash of the text + prompt it was generated from;
+    # kept apart from the user-editable summary, and not loaded with the chapter
+    generated_summary = deferred(Column(Text, nullable=True))
+    generated_summary_hash = Column(String(32), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -110,6 +144,9 @@ class Chapter(Base):
 
 class Character(Base):
     __tablename__ = "characters"
+    __table_args__ = (
+        Index("ix_character_story", "story_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     story_id = Column(Integer, ForeignKey("stories.id"), nullable=False)
@@ -134,6 +171,10 @@ class PlotBrainstorm(Base):
 
 class BeatScene(Base):
     __tablename__ = "beatscenes"
+    __table_args__ = (
+        # Beat lists filter on chapter_id and sort by order; served straight from the index
+        Index("ix_beatscene_chapter_order", "chapter_id", "order"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=False)
@@ -146,6 +187,9 @@ class BeatScene(Base):
 
 class KeyEvent(Base):
     __tablename__ = "keyevents"
+    __table_args__ = (
+        Index("ix_keyevent_chapter_order", "chapter_id", "order"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=False)
@@ -158,6 +202,9 @@ class KeyEvent(Base):
 
 class WorldBuildingElement(Base):
     __tablename__ = "world_building"
+    __table_args__ = (
+        Index("ix_world_building_chapter", "chapter_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from typing import Generator
 import os
@@ -39,20 +39,77 @@ DATABASE_URL = get_database_url()
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         DATABASE_URL,
-        connect_args={"check_same_thread": False}  # Needed for SQLite
+        connect_args={"check_same_thread": False},  # Needed for SQLite
+        query_cache_size=1200  # Keep compiled SQL for every endpoint's statements
     )
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL + NORMAL sync avoids an fsync per commit in development; a 64 MB
+        # page cache, in-memory temp tables and a 256 MB mmap keep repeated
+        # reads off the disk
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
 else:
-    # PostgreSQL configuration
+    # PostgreSQL configuration; the pool is per worker process. At the
+    # default 2 workers, this pool (10 + 20) plus the vector pool (5 + 5)
+    # peaks at 80 connections, under Postgres' default max_connections of 100.
+    # Shrink both pools when raising WEB_CONCURRENCY
     engine = create_engine(
         DATABASE_URL,
-        pool_pre_ping=True,  # Verify connections before using
-        pool_size=5,
-        max_overflow=10
+        # SELECT 1 on every checkout; pool_recycle already covers idle timeouts,
+        # so colocated deployments can set DB_POOL_PRE_PING=0 to save the round-trip
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "1") == "1",
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),  # Drop connections before server/proxy idle timeouts
+        query_cache_size=1200,  # Keep compiled SQL for every endpoint's statements
+        # psycopg2: multi-row INSERT ... VALUES for executemany inserts (with
+        # RETURNING), and execute_batch for executemany UPDATE/DELETE
+        executemany_mode="values_plus_batch",
+        insertmanyvalues_page_size=1000,
+        executemany_batch_page_size=500
     )
 
+# Advisory lock key guarding schema creation across worker processes
+SCHEMA_LOCK_KEY = 7340100
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _add_missing_columns(conn):
+    """
+    create_all never alters an existing table; add any nullable column
+    declared since the table was created
+    """
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"
+                ))
+                logger.info(f"✅ Added column {table.name}.{column.name}")
+
+def _create_missing_indexes(conn):
+    """
+    create_all only builds indexes along with a new table; add any declared
+    since an existing table was created
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
 def init_db():
     """
     Initialize the database with try-create logic per SOP:
@@ -73,7 +130,19 @@ def init_db():
             except Exception as e:
                 logger.warning(f"⚠️  Could not enable pgvector extension: {e}")
         
-        Base.metadata.create_all(bind=engine)
+        if DATABASE_URL.startswith("sqlite"):
+            Base.metadata.create_all(bind=engine)
+            with engine.begin() as conn:
+                _add_missing_columns(conn)
+                _create_missing_indexes(conn)
+        else:
+            # Each uvicorn worker runs init_db at import; serialize them so
+            # concurrent CREATE TABLEs don't collide
+            with engine.begin() as conn:
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+                Base.metadata.create_all(bind=conn)
+                _add_missing_columns(conn)
+                _create_missing_indexes(conn)
         logger.info("✅ Database schema initialized successfully")
     except Exception as e:
         logger.error(f"❌ Failed to initialize database: {e}")
@@ -1,9 +1,13 @@
 import os
+import asyncio
 import aiofiles
 from fastapi import UploadFile
-from typing import List
+from typing import List, Tuple
 import csv
 import json
+import orjson
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 class FileService:
     def __init__(self, upload_dir: str = "./data/uploads"):
@@ -16,16 +20,19 @@ class FileService:
         os.makedirs(project_dir, exist_ok=True)
         return project_dir
     
-    async def save_upload(self, project_id: str, file: UploadFile) -> str:
-        """Save uploaded file"""
+    async def save_upload(self, project_id: str, file: UploadFile) -> Tuple[str, int]:
+        """Save uploaded file in fixed-size chunks, returning its path and size in bytes"""
         project_dir = self._get_project_dir(project_id)
         file_path = os.path.join(project_dir, file.filename)
         
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        file_size = 0
+        # Unbuffered: chunks are already large, so skip the extra copy
+        async with aiofiles.open(file_path, 'wb', buffering=0) as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await f.write(chunk)
+                file_size += len(chunk)
         
-        return file_path
+        return file_path, file_size
     
     async def extract_text(self, file_path: str) -> str:
         """Extract text content from file"""
@@ -36,19 +43,10 @@ class FileService:
                 return await f.read()
         
         elif ext == '.csv':
-            text_content = []
-            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                reader = csv.DictReader(content.splitlines())
-                for row in reader:
-                    text_content.append(json.dumps(row))
-            return "\n".join(text_content)
+            return await asyncio.to_thread(self._csv_to_text, file_path)
         
         elif ext == '.json':
-            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                data = json.loads(content)
-                return json.dumps(data, indent=2)
+            return await asyncio.to_thread(self._json_to_text, file_path)
         
         else:
             # Try reading as text
@@ -58,19 +56,34 @@ class FileService:
             except Exception:
                 return f"File: {os.path.basename(file_path)} (binary content)"
     
+    @staticmethod
+    def _csv_to_text(file_path: str) -> str:
+        """One JSON object per row, parsed from the file a row at a time rather than read whole"""
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            return "\n".join(orjson.dumps(row).decode() for row in csv.DictReader(f))
+    
+    @staticmethod
+    def _json_to_text(file_path: str) -> str:
+        """Pretty-printed JSON; stdlib json keeps integers of any width exact (orjson turns them into floats)"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.dumps(json.load(f), indent=2)
+    
     def list_files(self, project_id: str) -> List[dict]:
         """List uploaded files for a project"""
         project_dir = self._get_project_dir(project_id)
         files = []
         
-        for filename in os.listdir(project_dir):
-            file_path = os.path.join(project_dir, filename)
-            if os.path.isfile(file_path):
-                files.append({
-                    "name": filename,
-                    "size": os.path.getsize(file_path),
-                    "modified": os.path.getmtime(file_path)
-                })
+        # scandir reports the entry type from the directory read and caches
+        # one stat per entry, instead of three stat calls per file
+        with os.scandir(project_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append({
+                        "name": entry.name,
+                        "size": stat.st_size,
+                        "modified": stat.st_mtime
+                    })
         
         return files
     
@@ -1,11 +1,105 @@
 import httpx
-import json
+import asyncio
+import importlib.util
+import orjson
 from typing import AsyncGenerator, Optional
 
+# httpx speaks HTTP/2 only when the h2 package is installed (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# One pooled client per process, shared by every OpenRouter caller, so
+# keep-alive connections (and HTTP/2 streams) are reused across requests
+# instead of paying a TCP + TLS handshake per call
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Fail fast when OpenRouter is unreachable; reads get the full budget since
+# completions can take a while to start streaming
+CONNECT_TIMEOUT = 5.0
+DEFAULT_TIMEOUT = httpx.Timeout(60.0, connect=CONNECT_TIMEOUT)
+SHORT_TIMEOUT = httpx.Timeout(30.0, connect=CONNECT_TIMEOUT)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared AsyncClient for the running event loop (60s default timeout)"""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client_loop is not loop:
+        # Pooled connections belong to the loop that opened them
+        _http_client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            http2=HTTP2_AVAILABLE
+        )
+        _http_client_loop = loop
+    return _http_client
+
+async def close_http_client():
+    """Close the shared client; called on application shutdown"""
+    global _http_client, _http_client_loop
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client, _http_client_loop = None, None
+
+_SSE_DATA_FIELD = b"data:"
+_SSE_DONE = b"[DONE]"
+
+def _sse_data(line: bytes) -> Optional[bytes]:
+    """Payload of a data: line (one optional leading space dropped, per the SSE spec), else None"""
+    if not line.startswith(_SSE_DATA_FIELD):
+        return None
+    data = line[5:]
+    return data[1:] if data[:1] == b" " else data
+
+async def _iter_sse_data(response: httpx.Response) -> AsyncGenerator[bytes, None]:
+    """
+    Payloads of an SSE response's data: lines, up to [DONE].
+    Lines are split on raw bytes; only payloads are handed on (orjson parses
+    bytes directly), so nothing is decoded to str per line.
+    """
+    buf = bytearray()
+    async for chunk in response.aiter_bytes():
+        buf += chunk
+        start = 0
+        while (nl := buf.find(b"\n", start)) != -1:
+            data = _sse_data(bytes(buf[start:nl]).rstrip(b"\r"))
+            start = nl + 1
+            if data is not None:
+                if data == _SSE_DONE:
+                    return
+                yield data
+        del buf[:start]
+    
+    # Final line without a trailing newline
+    data = _sse_data(bytes(buf).rstrip(b"\r"))
+    if data is not None and data != _SSE_DONE:
+        yield data
+
+# Chat system prompts, by quick-action command and by thinking-partner style
+_ACTION_PROMPTS = {
+    '/improve': 'Improve the following text by making it more clear, impactful, and well-written. Return ONLY the improved version of the text with no explanations, preambles, or commentary.',
+    '/expand': 'Expand the following text with more detail, depth, and elaboration. Return ONLY the expanded version of the text with no explanations, preambles, or commentary.',
+    '/simplify': 'Simplify the following text to make it clearer and more concise. Return ONLY the simplified version of the text with no explanations, preambles, or commentary.',
+    '/challenge': 'Challenge the assumptions and arguments in the following text. Return ONLY a revised version that addresses these challenges with no explanations, preambles, or commentary.'
+}
+_QUICK_ACTIONS = frozenset(_ACTION_PROMPTS)
+
+_PARTNER_PROMPTS = {
+    "critical": "You are a critical thinking partner. Challenge assumptions, identify flaws, and ask probing questions. Be rigorous and analytical.",
+    "balanced": "You are a balanced thinking partner. Weigh options thoughtfully, provide multiple perspectives, and help refine ideas with constructive feedback.",
+    "expansive": "You are an expansive thinking partner. Explore possibilities freely, make creative connections, and encourage bold ideas without immediate criticism."
+}
+
 class OpenRouterService:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://openrouter.ai/api/v1"
+        # Same for every request; built once rather than per call
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://membrane.app",
+            "X-Title": "The Membrane"
+        }
         
     async def stream_chat(
         self,
@@ -17,37 +111,18 @@ class OpenRouterService:
         """Stream chat completions from OpenRouter"""
         
         # Detect if this is a quick action command (text improvement)
-        is_quick_action = message.lower().strip() in ['/improve', '/expand', '/simplify', '/challenge']
+        command = message.strip().lower()
+        is_quick_action = command in _QUICK_ACTIONS
         
         if is_quick_action:
             # Strict text-only transformation prompt
-            action_prompts = {
-                '/improve': 'Improve the following text by making it more clear, impactful, and well-written. Return ONLY the improved version of the text with no explanations, preambles, or commentary.',
-                '/expand': 'Expand the following text with more detail, depth, and elaboration. Return ONLY the expanded version of the text with no explanations, preambles, or commentary.',
-                '/simplify': 'Simplify the following text to make it clearer and more concise. Return ONLY the simplified version of the text with no explanations, preambles, or commentary.',
-                '/challenge': 'Challenge the assumptions and arguments in the following text. Return ONLY a revised version that addresses these challenges with no explanations, preambles, or commentary.'
-            }
-            
-            system_prompt = action_prompts.get(message.lower().strip(), action_prompts['/improve'])
+            system_prompt = _ACTION_PROMPTS[command]
             user_message = f"Text to transform:\n\n{context}\n\nIMPORTANT: Output ONLY the transformed text. No preamble, no explanation, no 'Here is...', no analysis. Just the pure transformed text."
         else:
             # Standard conversational mode
-            partner_prompts = {
-                "critical": "You are a critical thinking partner. Challenge assumptions, identify flaws, and ask probing questions. Be rigorous and analytical.",
-                "balanced": "You are a balanced thinking partner. Weigh options thoughtfully, provide multiple perspectives, and help refine ideas with constructive feedback.",
-                "expansive": "You are an expansive thinking partner. Explore possibilities freely, make creative connections, and encourage bold ideas without immediate criticism."
-            }
-            
-            system_prompt = partner_prompts.get(partner, partner_prompts["balanced"])
+            system_prompt = _PARTNER_PROMPTS.get(partner, _PARTNER_PROMPTS["balanced"])
             user_message = f"{context}\n\nUser message: {message}"
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://membrane.app",
-            "X-Title": "The Membrane"
-        }
-        
         payload = {
             "model": model,
             "messages": [
@@ -59,27 +134,57 @@ class OpenRouterService:
             "max_tokens": 2000
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            if "choices" in chunk and len(chunk["choices"]) > 0:
-                                delta = chunk["choices"][0].get("delta", {})
-                                if "content" in delta:
-                                    yield delta["content"]
-                        except json.JSONDecodeError:
-                            continue
+        client = get_http_client()
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            content=orjson.dumps(payload)
+        ) as response:
+            response.raise_for_status()
+            async for data in _iter_sse_data(response):
+                try:
+                    chunk = orjson.loads(data)
+                    if "choices" in chunk and len(chunk["choices"]) > 0:
+                        delta = chunk["choices"][0].get("delta", {})
+                        if "content" in delta:
+                            yield delta["content"]
+                except orjson.JSONDecodeError:
+                    continue
+    
+    async def stream_prompt(
+        self,
+        prompt: str,
+        model: str,
+        max_tokens: Optional[int] = None
+    ) -> AsyncGenerator[str, None]:
+        """Stream a completion for a single user prompt, with no system prompt"""
+        
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True
+        }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        
+        client = get_http_client()
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            content=orjson.dumps(payload)
+        ) as response:
+            response.raise_for_status()
+            async for data in _iter_sse_data(response):
+                try:
+                    chunk = orjson.loads(data)
+                    if "choices" in chunk and len(chunk["choices"]) > 0:
+                        delta = chunk["choices"][0].get("delta", {})
+                        if delta.get("content"):
+                            yield delta["content"]
+                except orjson.JSONDecodeError:
+                    continue
     
     async def get_ghost_suggestion(
         self,
@@ -107,13 +212,6 @@ class OpenRouterService:
         
         purpose_desc = purpose_prompts.get(purpose, purpose_prompts["general"])
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://membrane.app",
-            "X-Title": "The Membrane"
-        }
-        
         payload = {
             "model": model,
             "messages": [
@@ -131,24 +229,25 @@ class OpenRouterService:
             "max_tokens": 50
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if "choices" in data and len(data["choices"]) > 0:
-                suggestion = data["choices"][0]["message"]["content"].strip()
-                # Remove any quotes or meta-text
-                suggestion = suggestion.strip('"\'')
-                # If it starts with apologizing or explaining, reject it
-                if any(suggestion.lower().startswith(x) for x in ['i cannot', 'i apologize', 'without', 'i need', 'please provide']):
-                    return ""
-                return " " + suggestion  # Add leading space
-            return ""
+        client = get_http_client()
+        response = await client.post(
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            content=orjson.dumps(payload),
+            timeout=SHORT_TIMEOUT
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        if "choices" in data and len(data["choices"]) > 0:
+            suggestion = data["choices"][0]["message"]["content"].strip()
+            # Remove any quotes or meta-text
+            suggestion = suggestion.strip('"\'')
+            # If it starts with apologizing or explaining, reject it
+            if any(suggestion.lower().startswith(x) for x in ['i cannot', 'i apologize', 'without', 'i need', 'please provide']):
+                return ""
+            return " " + suggestion  # Add leading space
+        return ""
     
     async def summarize_text(
         self,
@@ -158,13 +257,6 @@ class OpenRouterService:
     ) -> str:
         """Summarize text using specified model and prompt"""
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://membrane.app",
-            "X-Title": "The Membrane"
-        }
-        
         payload = {
             "model": model,
             "messages": [
@@ -182,15 +274,15 @@ class OpenRouterService:
             "max_tokens": 1000
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if "choices" in data and len(data["choices"]) > 0:
-                return data["choices"][0]["message"]["content"].strip()
-            return ""
+        client = get_http_client()
+        response = await client.post(
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            content=orjson.dumps(payload)
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        if "choices" in data and len(data["choices"]) > 0:
+            return data["choices"][0]["message"]["content"].strip()
+        return ""
@@ -0,0 +1,118 @@
+"""Semantic cache for LLM responses, stored alongside project memories in the vector store"""
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import threading
+
+from cachetools import TTLCache
+
+CACHE_SIMILARITY_THRESHOLD = float(os.getenv("CACHE_SIMILARITY_THRESHOLD", "0.95"))
+
+
+class SemanticCache:
+    def __init__(self, vector_service, threshold: float = CACHE_SIMILARITY_THRESHOLD):
+        self.vector_service = vector_service
+        self.threshold = threshold
+        # Exact-match tier, checked before paying for an embedding; per process
+        self._exact: TTLCache = TTLCache(maxsize=2048, ttl=3600)
+        self._exact_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.vector_service is not None and self.vector_service.enabled
+
+    @staticmethod
+    def collection_name(user_id: int, project_id: int) -> str:
+        return f"user_{user_id}_project_{project_id}_llmcache"
+
+    @staticmethod
+    def user_collection_name(user_id: int) -> str:
+        """Cache collection for LLM calls that aren't tied to a project"""
+        return f"user_{user_id}_llmcache"
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """128-bit digest used to scope cache entries to an exact document"""
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _exact_key(self, collection_name: str, query: str, scope: Dict) -> str:
+        return self.content_hash("\0".join([collection_name, json.dumps(scope, sort_keys=True), query]))
+
+    async def lookup_cached(
+        self,
+        collection_name: str,
+        query: str,
+        scope: Dict,
+        semantic: bool = True
+    ) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Find a cached response: the exact-match tier first, then (with semantic=True)
+        the most similar stored query with the same scope.
+        Returns (response, query_embedding); response is None on a miss.
+        The embedding is returned so a miss can be remembered without re-embedding.
+        """
+        key = self._exact_key(collection_name, query, scope)
+        with self._exact_lock:
+            cached = self._exact.get(key)
+        if cached is not None:
+            return cached, None
+        if not semantic or not self.enabled:
+            return None, None
+
+        try:
+            embedding = await self.vector_service.embed(query)
+            hit = await asyncio.to_thread(self.vector_service.nearest, collection_name, embedding, scope)
+        except Exception as e:
+            print(f"⚠️  Semantic cache lookup failed: {e}")
+            return None, None
+
+        if hit and hit[1] >= self.threshold:
+            print(f"⚡ Semantic cache hit (similarity {hit[1]:.3f}) in {collection_name}")
+            with self._exact_lock:
+                self._exact[key] = hit[0]
+            return hit[0], embedding
+        return None, embedding
+
+    def remember(
+        self,
+        collection_name: str,
+        query: str,
+        scope: Dict,
+        embedding: Optional[List[float]],
+        response: str
+    ):
+        """Cache a fresh response in both tiers (blocking; run via to_thread from async code)"""
+        if not response or not response.strip():
+            return
+        with self._exact_lock:
+            self._exact[self._exact_key(collection_name, query, scope)] = response
+        if not self.enabled or embedding is None:
+            return
+
+        try:
+            self.vector_service.add_embedding(collection_name, response, embedding, scope)
+        except Exception as e:
+            print(f"⚠️  Semantic cache store failed: {e}")
+
+    async def get_or_compute(
+        self,
+        collection_name: str,
+        query: str,
+        scope: Dict,
+        compute: Callable[[], Awaitable[str]],
+        semantic: bool = True
+    ) -> str:
+        """
+        Return a cached response for query, or await compute() and cache its result.
+        Exact repeats are answered from memory; with semantic=True, near-duplicates
+        are then looked up in the vector store.
+        """
+        cached, embedding = await self.lookup_cached(collection_name, query, scope, semantic)
+        if cached is not None:
+            return cached
+
+        response = await compute()
+        await asyncio.to_thread(self.remember, collection_name, query, scope, embedding, response)
+        return response
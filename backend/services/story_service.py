@@ -1,9 +1,39 @@
 """Story Engine Service for creative writing assistance"""
-from typing import List, Optional, Dict
-from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Tuple
+from sqlalchemy import select, insert, bindparam
+from sqlalchemy.orm import Session, selectinload, raiseload
 from models import Story, Chapter, Character, PlotBrainstorm, BeatScene, KeyEvent, WorldBuildingElement
 from services.openrouter_service import OpenRouterService
+from cachetools import TTLCache
+import asyncio
 import os
+import threading
+
+# Built once; every story endpoint runs this ownership lookup
+_OWNED_STORY_STMT = select(Story).options(raiseload("*")).where(
+    Story.id == bindparam("story_id"),
+    Story.user_id == bindparam("user_id")
+)
+_OWNED_STORY_ID_STMT = select(Story.id).where(
+    Story.id == bindparam("story_id"),
+    Story.user_id == bindparam("user_id")
+)
+
+# A chapter's child collections, loaded one IN query per relationship.
+# Read queries add raiseload("*") after their eager loads, so touching any
+# other relationship raises instead of quietly issuing a query per row
+_CHAPTER_CHILDREN = (
+    selectinload(Chapter.beatscenes),
+    selectinload(Chapter.keyevents),
+    selectinload(Chapter.world_building)
+)
+
+# Confirmed (story_id, user_id) ownership; an editing session re-checks the
+# same pair on nearly every request. Only positives are cached, and a
+# story's entry is dropped when it's deleted. Accessed from threadpool
+# workers, so guarded by a lock.
+_story_owner_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+_story_owner_cache_lock = threading.Lock()
 
 
 class StoryService:
@@ -12,70 +42,128 @@ class StoryService:
     
     # Story CRUD
     def create_story(self, db: Session, user_id: int, title: str, description: str = None) -> Story:
-        story = Story(user_id=user_id, title=title, description=description)
-        db.add(story)
-        db.commit()
-        db.refresh(story)
-        
-        # Automatically create first chapter
-        first_chapter = Chapter(
-            story_id=story.id,
-            title=f"{title} - Chapter 1",
-            text="",
-            order=1
-        )
-        db.add(first_chapter)
+        values = {"user_id": user_id, "title": title, "description": description}
+        story_id, created_at, updated_at = db.execute(
+            insert(Story).returning(Story.id, Story.created_at, Story.updated_at), values
+        ).one()
+        
+        # Automatically create first chapter, in the same transaction
+        db.execute(insert(Chapter), {
+            "story_id": story_id,
+            "title": f"{title} - Chapter 1",
+            "text": "",
+            "order": 1
+        })
         db.commit()
-        db.refresh(story)
+        self.remember_owner(story_id, user_id)
         
-        return story
+        return Story(id=story_id, created_at=created_at, updated_at=updated_at, **values)
     
     def get_story(self, db: Session, story_id: int, user_id: int) -> Optional[Story]:
-        # Expire all objects to ensure fresh data from database
-        db.expire_all()
-        return db.query(Story).filter(
+        # Overwrite this row if the session already holds it, rather than
+        # expiring (and later reloading) every object in the session
+        return db.execute(
+            _OWNED_STORY_STMT, {"story_id": story_id, "user_id": user_id},
+            execution_options={"populate_existing": True}
+        ).scalar_one_or_none()
+    
+    def authorize_story(self, db: Session, story_id: int, user_id: int) -> bool:
+        """Whether the user owns the story, answered from cache when recently confirmed"""
+        key = (story_id, user_id)
+        with _story_owner_cache_lock:
+            if key in _story_owner_cache:
+                return True
+        
+        owned = db.execute(
+            _OWNED_STORY_ID_STMT, {"story_id": story_id, "user_id": user_id}
+        ).scalar_one_or_none() is not None
+        if owned:
+            self.remember_owner(story_id, user_id)
+        return owned
+    
+    def remember_owner(self, story_id: int, user_id: int):
+        """Record ownership confirmed by some other query"""
+        with _story_owner_cache_lock:
+            _story_owner_cache[(story_id, user_id)] = True
+    
+    def get_story_with_children(self, db: Session, story_id: int, user_id: int) -> Optional[Story]:
+        """Like get_story, but loads chapters and characters up front in one extra query each"""
+        return db.query(Story).options(
+            selectinload(Story.chapters),
+            selectinload(Story.characters),
+            raiseload("*")
+        ).populate_existing().filter(
             Story.id == story_id,
             Story.user_id == user_id
         ).first()
     
-    def get_user_stories(self, db: Session, user_id: int) -> List[Story]:
-        return db.query(Story).filter(Story.user_id == user_id).all()
+    def get_story_outline(self, db: Session, story_id: int, user_id: int) -> Optional[Story]:
+        """Story with chapter and character metadata only, leaving chapter text and backstories unloaded"""
+        return db.query(Story).options(
+            selectinload(Story.chapters).load_only(Chapter.id, Chapter.title, Chapter.summary, Chapter.order),
+            selectinload(Story.characters).load_only(Character.id, Character.name, Character.traits),
+            raiseload("*")
+        ).filter(
+            Story.id == story_id,
+            Story.user_id == user_id
+        ).first()
     
     def update_story(self, db: Session, story_id: int, user_id: int, **kwargs) -> Optional[Story]:
-        story = self.get_story(db, story_id, user_id)
-        if not story:
+        # Primary-key get: answered from the identity map when the session
+        # already holds the story, otherwise a single SELECT by id
+        story = db.get(Story, story_id)
+        if not story or story.user_id != user_id:
             return None
         
         for key, value in kwargs.items():
             if hasattr(story, key):
                 setattr(story, key, value)
         
+        if not db.is_modified(story):
+            return story
+        
+        # Detach once the UPDATE is flushed so the commit doesn't expire the
+        # values just written; re-reading them would cost another SELECT
+        db.flush()
+        db.expunge(story)
         db.commit()
-        db.refresh(story)
         return story
     
     def delete_story(self, db: Session, story_id: int, user_id: int) -> bool:
-        story = self.get_story(db, story_id, user_id)
+        # The delete cascades through every chapter's children; load the whole
+        # tree up front so the cascade doesn't lazy-load each chapter separately
+        story = db.query(Story).options(
+            selectinload(Story.chapters).options(*_CHAPTER_CHILDREN),
+            selectinload(Story.characters),
+            selectinload(Story.plot_brainstorms)
+        ).filter(
+            Story.id == story_id,
+            Story.user_id == user_id
+        ).first()
         if not story:
             return False
         
         db.delete(story)
         db.commit()
+        with _story_owner_cache_lock:
+            _story_owner_cache.pop((story_id, user_id), None)
         return True
     
     # Chapter CRUD
     def create_chapter(self, db: Session, story_id: int, title: str = None, text: str = None) -> Chapter:
-        chapter = Chapter(story_id=story_id, title=title, text=text)
-        db.add(chapter)
+        values = {"story_id": story_id, "title": title, "text": text}
+        chapter_id = db.execute(insert(Chapter).returning(Chapter.id), values).scalar_one()
         db.commit()
-        db.refresh(chapter)
-        return chapter
+        # Built from the inserted values (detached) rather than re-selecting the row
+        return Chapter(id=chapter_id, **values)
     
     def get_chapter(self, db: Session, chapter_id: int) -> Optional[Chapter]:
         return db.query(Chapter).filter(Chapter.id == chapter_id).first()
     
     def get_story_chapters(self, db: Session, story_id: int) -> List[Chapter]:
-        return db.query(Chapter).filter(Chapter.story_id == story_id).order_by(Chapter.order).all()
+        return db.query(Chapter).options(*_CHAPTER_CHILDREN, raiseload("*")).filter(
+            Chapter.story_id == story_id
+        ).order_by(Chapter.order).all()
     
     def update_chapter(self, db: Session, chapter_id: int, **kwargs) -> Optional[Chapter]:
         chapter = self.get_chapter(db, chapter_id)
@@ -86,22 +174,46 @@ class StoryService:
             if hasattr(chapter, key):
                 setattr(chapter, key, value)
         
+        # Autosaves often resend unchanged fields; skip the write entirely then
+        if not db.is_modified(chapter):
+            return chapter
+        
         db.commit()
         db.refresh(chapter)
         return chapter
     
     # Character CRUD
     def create_character(self, db: Session, story_id: int, name: str, traits: str = None, backstory: str = None) -> Character:
-        character = Character(story_id=story_id, name=name, traits=traits, backstory=backstory)
-        db.add(character)
+        values = {"story_id": story_id, "name": name, "traits": traits, "backstory": backstory}
+        character_id = db.execute(insert(Character).returning(Character.id), values).scalar_one()
         db.commit()
-        db.refresh(character)
-        return character
+        return Character(id=character_id, **values)
+    
+    def create_characters(self, db: Session, story_id: int, rows: List[Dict]) -> List[Character]:
+        """Insert several characters in one multi-row INSERT and a single commit"""
+        values = [
+            {"story_id": story_id, "name": r["name"], "traits": r.get("traits"), "backstory": r.get("backstory")}
+            for r in rows
+        ]
+        if not values:
+            return []
+        character_ids = db.execute(
+            insert(Character).returning(Character.id, sort_by_parameter_order=True), values
+        ).scalars().all()
+        db.commit()
+        return [Character(id=character_id, **v) for character_id, v in zip(character_ids, values)]
     
     def get_story_characters(self, db: Session, story_id: int) -> List[Character]:
         return db.query(Character).filter(Character.story_id == story_id).all()
     
     # AI-Powered Story Generation
+    async def _complete(self, prompt: str, model: str = "anthropic/claude-3.5-sonnet") -> str:
+        """Full text of a single-prompt completion"""
+        chunks = []
+        async for chunk in self.openrouter.stream_prompt(prompt, model):
+            chunks.append(chunk)
+        return "".join(chunks)
+    
     async def generate_chapter_summary(self, chapter_text: str) -> str:
         """Generate a summary of a chapter using AI"""
         prompt = f"""Summarize the following chapter in 2-3 sentences, capturing the key events and emotional arc:
@@ -110,13 +222,7 @@ class StoryService:
 
 Summary:"""
         
-        response = ""
-        async for chunk in self.openrouter.chat_stream(
-            messages=[{"role": "user", "content": prompt}],
-            model="anthropic/claude-3.5-sonnet"
-        ):
-            if chunk:
-                response += chunk
+        response = await self._complete(prompt)
         
         return response.strip()
     
@@ -137,13 +243,7 @@ Generate a detailed character profile including:
 
 Character Profile:"""
         
-        response = ""
-        async for chunk in self.openrouter.chat_stream(
-            messages=[{"role": "user", "content": prompt}],
-            model="anthropic/claude-3.5-sonnet"
-        ):
-            if chunk:
-                response += chunk
+        response = await self._complete(prompt)
         
         return response.strip()
     
@@ -157,13 +257,7 @@ Suggest 5 potential plot developments, twists, or directions the story could tak
 
 Plot Suggestions:"""
         
-        response = ""
-        async for chunk in self.openrouter.chat_stream(
-            messages=[{"role": "user", "content": prompt}],
-            model="anthropic/claude-3.5-sonnet"
-        ):
-            if chunk:
-                response += chunk
+        response = await self._complete(prompt)
         
         return response.strip()
     
@@ -177,13 +271,7 @@ Break this down into 5-7 specific scene beats that capture the key moments and t
 
 Scene Beats:"""
         
-        response = ""
-        async for chunk in self.openrouter.chat_stream(
-            messages=[{"role": "user", "content": prompt}],
-            model="anthropic/claude-3.5-sonnet"
-        ):
-            if chunk:
-                response += chunk
+        response = await self._complete(prompt)
         
         # Parse into list
         beats = [line.strip() for line in response.strip().split('\n') if line.strip() and not line.strip().startswith('Scene Beats:')]
@@ -201,12 +289,23 @@ Scene Beats:"""
 
 {category}:"""
         
-        response = ""
-        async for chunk in self.openrouter.chat_stream(
-            messages=[{"role": "user", "content": prompt}],
-            model="anthropic/claude-3.5-sonnet"
-        ):
-            if chunk:
-                response += chunk
+        response = await self._complete(prompt)
         
         return response.strip()
+    
+    # The LLM calls are independent and network-bound, so run them concurrently
+    async def generate_chapter_bundle(self, chapter_text: str) -> Tuple[str, List[str]]:
+        """Summary and scene beats for a chapter"""
+        summary, beats = await asyncio.gather(
+            self.generate_chapter_summary(chapter_text),
+            self.generate_scene_beats(chapter_text)
+        )
+        return summary, beats
+    
+    async def generate_character_bundle(self, character_name: str, story_context: str) -> Tuple[str, str]:
+        """Character development and plot suggestions for the same story context"""
+        development, plot = await asyncio.gather(
+            self.generate_character_development(character_name, story_context),
+            self.generate_plot_suggestions(story_context)
+        )
+        return development, plot
@@ -0,0 +1,68 @@
+"""Token budgeting for prompt content sent to the LLM"""
+from typing import Optional
+import threading
+
+from cachetools import LRUCache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough chars-per-token ratio used when the tokenizer is unavailable
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = "[... earlier text omitted to fit the model's context window ...]\n"
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+# (content_hash, max_tokens) -> trimmed text, so re-chatting on the same document skips tokenization
+_trim_cache = LRUCache(maxsize=256)
+_trim_cache_lock = threading.Lock()
+
+
+def load_encoder():
+    """cl100k_base encoder, loaded once; None if tiktoken or its vocabulary is unavailable"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        with _encoder_lock:
+            if not _encoder_loaded:
+                if tiktoken is not None:
+                    try:
+                        _encoder = tiktoken.get_encoding("cl100k_base")
+                    except Exception as e:
+                        print(f"⚠️  tiktoken encoding unavailable, estimating tokens from length: {e}")
+                _encoder_loaded = True
+    return _encoder
+
+
+def trim_to_token_budget(text: str, max_tokens: int, cache_key: Optional[str] = None) -> str:
+    """
+    Keep the last max_tokens tokens of text, marking the cut.
+    The tail is kept because it's the part being written right now.
+    """
+    # A cl100k token spans at least one UTF-8 byte (CJK characters and emoji
+    # can take several tokens each), so text this short always fits
+    if len(text.encode("utf-8")) <= max_tokens:
+        return text
+
+    if cache_key is not None:
+        with _trim_cache_lock:
+            cached = _trim_cache.get((cache_key, max_tokens))
+        if cached is not None:
+            return cached
+
+    encoder = load_encoder()
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        trimmed = text if len(tokens) <= max_tokens else TRUNCATION_MARKER + encoder.decode(tokens[-max_tokens:])
+    else:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        trimmed = text if len(text) <= max_chars else TRUNCATION_MARKER + text[-max_chars:]
+
+    if cache_key is not None:
+        with _trim_cache_lock:
+            _trim_cache[(cache_key, max_tokens)] = trimmed
+    return trimmed
@@ -1,16 +1,298 @@
-import httpx
-from typing import List, Dict, Optional
-from sqlalchemy import create_engine, text
+from services.openrouter_service import get_http_client, SHORT_TIMEOUT
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import bindparam, create_engine, event, text
+from sqlalchemy.engine import Engine
 import os
+import io
+import csv
 import json
+import hashlib
+import re
+import orjson
+import asyncio
+import random
+import threading
+import httpx
+import numpy as np
+from cachetools import LRUCache
+
+EMBEDDING_MODEL = "openai/text-embedding-3-small"
+
+# Concurrent embedding requests are coalesced for up to EMBED_BATCH_WAIT seconds
+EMBED_BATCH_MAX = 32
+EMBED_BATCH_WAIT = 0.01
+# Waiting callers beyond this are refused rather than queued without bound
+EMBED_QUEUE_MAX = 1024
+
+# Limits for one embeddings request when embedding many texts up front;
+# ~4 chars per token keeps a request well under the provider's token cap
+EMBED_REQUEST_MAX_ITEMS = 128
+EMBED_REQUEST_MAX_CHARS = 400_000
+# Inserts of at least this many rows are streamed with COPY through a staging
+# table instead of being parsed as one large multi-row INSERT
+COPY_MIN_ROWS = 32
+
+# Bulk adds keep this many embedding requests in flight at once
+EMBED_REQUEST_CONCURRENCY = 4
+
+# Rate limits, server errors and dropped connections are retried with full-jitter
+# exponential backoff (or the server's Retry-After), up to EMBED_RETRY_ATTEMPTS tries
+EMBED_RETRY_ATTEMPTS = 6
+EMBED_RETRY_MAX_WAIT = 30.0
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Recently used single-text embeddings (mostly search queries) kept per process
+EMBED_MEMORY_CACHE_SIZE = 2048
+
+# Query spellings that differ only in case, apostrophes, punctuation or spacing share an embedding
+_QUERY_APOSTROPHES = re.compile(r"['\u2019]")
+_QUERY_NOISE = re.compile(r"[^\w]+")
+
+class EmbeddingQueueFull(Exception):
+    """Too many embedding requests are already waiting; the caller should back off"""
+
+# Advisory lock key guarding vector table setup across worker processes
+SCHEMA_LOCK_KEY = 7340101
+
+# Fallback search streams candidates through a server-side cursor this many
+# rows (~3 MB of int8 codes) at a time
+SCORE_CHUNK_ROWS = 2000
+
+# HNSW needs pgvector 0.5.0; older versions get an ivfflat index
+HNSW_MIN_VERSION = (0, 5, 0)
+
+_CACHED_EMBEDDINGS_STMT = text("""
+    SELECT content_hash, embedding
+    FROM embedding_cache
+    WHERE model = :model AND content_hash IN :hashes
+""").bindparams(bindparam("hashes", expanding=True))
+
+def _parse_version(version: Optional[str]) -> Tuple[int, ...]:
+    """'0.5.1' -> (0, 5, 1); unknown versions sort lowest"""
+    try:
+        return tuple(int(part) for part in (version or "").split("."))
+    except ValueError:
+        return ()
+
+# Bump when vector_embeddings' layout changes; startup only inspects and
+# migrates the table when the recorded version (or pgvector mode) differs
+VECTOR_SCHEMA_VERSION = 2
+
+_CREATE_SCHEMA_META_STMT = text("""
+    CREATE TABLE IF NOT EXISTS vector_schema_meta (
+        id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        use_pgvector BOOLEAN NOT NULL
+    )
+""")
+
+_UPSERT_SCHEMA_META_STMT = text("""
+    INSERT INTO vector_schema_meta (id, version, use_pgvector)
+    VALUES (1, :version, :use_pgvector)
+    ON CONFLICT (id) DO UPDATE
+    SET version = EXCLUDED.version, use_pgvector = EXCLUDED.use_pgvector
+""")
+
+# (installed, available): whether pgvector is enabled in this database, and
+# whether the server could enable it
+_PGVECTOR_PROBE_STMT = text("""
+    SELECT
+        EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'vector'),
+        EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'vector')
+""")
+
+# Column name -> type name of the existing vector_embeddings table, if any
+_VECTOR_TABLE_COLUMNS_STMT = text("""
+    SELECT column_name, udt_name
+    FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'vector_embeddings'
+""")
+
+# Access method (hnsw/ivfflat) of the existing embedding index, if any
+_EMBEDDING_INDEX_METHOD_STMT = text("""
+    SELECT am.amname
+    FROM pg_class c
+    JOIN pg_am am ON am.oid = c.relam
+    WHERE c.relname = 'vector_embeddings_embedding_idx'
+      AND c.relnamespace = current_schema()::regnamespace
+""")
+
+_PGVECTOR_SEARCH_STMT = text("""
+    SELECT content
+    FROM vector_embeddings
+    WHERE collection_name = :collection
+    ORDER BY embedding <=> CAST(:query_embedding AS vector)
+    LIMIT :limit
+""")
+
+_PGVECTOR_NEAREST_STMT = text("""
+    SELECT content, 1 - (embedding <=> CAST(:query_embedding AS vector))
+    FROM vector_embeddings
+    WHERE collection_name = :collection
+      AND metadata @> CAST(:where AS jsonb)
+    ORDER BY embedding <=> CAST(:query_embedding AS vector)
+    LIMIT 1
+""")
+
+# Fallback scoring reads ids and embeddings only; content can be ~30 KB a row
+_FALLBACK_CANDIDATES_STMT = text("""
+    SELECT id, embedding
+    FROM vector_embeddings
+    WHERE collection_name = :collection
+""")
+
+_FALLBACK_FILTERED_CANDIDATES_STMT = text("""
+    SELECT id, embedding
+    FROM vector_embeddings
+    WHERE collection_name = :collection
+      AND metadata @> CAST(:where AS jsonb)
+""")
+
+_CONTENTS_BY_ID_STMT = text("""
+    SELECT id, content
+    FROM vector_embeddings
+    WHERE id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+_PGVECTOR_INSERT_STMT = text("""
+    INSERT INTO vector_embeddings 
+    (collection_name, content, content_hash, embedding, metadata)
+    VALUES (:collection, :content, :content_hash, CAST(:embedding AS vector), CAST(:metadata AS jsonb))
+    ON CONFLICT (collection_name, content_hash) DO NOTHING
+""")
+
+_FALLBACK_INSERT_STMT = text("""
+    INSERT INTO vector_embeddings 
+    (collection_name, content, content_hash, embedding, metadata)
+    VALUES (:collection, :content, :content_hash, :embedding, :metadata)
+    ON CONFLICT (collection_name, content_hash) DO NOTHING
+""")
+
+# Per-session staging table for COPY; rows vanish at commit, the table stays
+_CREATE_STAGING_STMT = text("""
+    CREATE TEMP TABLE IF NOT EXISTS vector_embeddings_staging (
+        collection_name TEXT,
+        content TEXT,
+        content_hash TEXT,
+        embedding TEXT,
+        metadata TEXT
+    ) ON COMMIT DELETE ROWS
+""")
+
+_COPY_STAGING_SQL = """
+    COPY vector_embeddings_staging (collection_name, content, content_hash, embedding, metadata)
+    FROM STDIN WITH (FORMAT csv)
+"""
+
+_PGVECTOR_INSERT_FROM_STAGING_STMT = text("""
+    INSERT INTO vector_embeddings (collection_name, content, content_hash, embedding, metadata)
+    SELECT collection_name, content, decode(content_hash, 'hex'), CAST(embedding AS vector), CAST(metadata AS jsonb)
+    FROM vector_embeddings_staging
+    ON CONFLICT (collection_name, content_hash) DO NOTHING
+""")
+
+_FALLBACK_INSERT_FROM_STAGING_STMT = text("""
+    INSERT INTO vector_embeddings (collection_name, content, content_hash, embedding, metadata)
+    SELECT collection_name, content, decode(content_hash, 'hex'), decode(embedding, 'hex'), CAST(metadata AS jsonb)
+    FROM vector_embeddings_staging
+    ON CONFLICT (collection_name, content_hash) DO NOTHING
+""")
+
+def _row_hash(content: str) -> bytes:
+    """Dedup key for a stored row within its collection"""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    """Seconds to wait before retry number attempt (1-based)"""
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), EMBED_RETRY_MAX_WAIT)
+        except ValueError:
+            pass  # HTTP-date form; fall back to backoff
+    return random.uniform(0, min(EMBED_RETRY_MAX_WAIT, 2.0 ** attempt))
+
+def _vector_literal(embedding: List[float]) -> str:
+    """pgvector text input, e.g. '[0.1,-0.2]'; orjson writes the list far faster than str() per float"""
+    return orjson.dumps(embedding).decode()
+
+# (url, hnsw_ef_search, ivfflat_probes) -> Engine; VectorService instances
+# with the same settings share one connection pool
+_engines: Dict[Tuple[str, int, int], Engine] = {}
+_engines_lock = threading.Lock()
+
+# database url -> (use_pgvector, vector_index), once its tables are set up
+_schemas: Dict[str, Tuple[bool, Optional[str]]] = {}
+_schemas_lock = threading.Lock()
+
+def _get_engine(database_url: str, hnsw_ef_search: int, ivfflat_probes: int) -> Engine:
+    """Pooled engine for the vector tables, created on first use"""
+    key = (database_url, hnsw_ef_search, ivfflat_probes)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(
+                database_url,
+                pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "1") == "1",
+                pool_size=int(os.getenv("VECTOR_DB_POOL_SIZE", "5")),
+                max_overflow=int(os.getenv("VECTOR_DB_MAX_OVERFLOW", "5")),
+                pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+                # Multi-row inserts go out in pages via execute_batch
+                executemany_mode="values_plus_batch"
+            )
+            
+            @event.listens_for(engine, "connect")
+            def _set_search_params(dbapi_connection, connection_record):
+                # ANN recall settings, once per new connection; outside a
+                # transaction so a later rollback doesn't undo them. Postgres
+                # accepts dotted custom settings before pgvector is loaded.
+                # JIT is off because the large cost estimates of vector scans
+                # trigger compilation that takes longer than the query.
+                autocommit = dbapi_connection.autocommit
+                dbapi_connection.autocommit = True
+                cursor = dbapi_connection.cursor()
+                cursor.execute("SET jit = off")
+                cursor.execute("SET hnsw.ef_search = %s", (hnsw_ef_search,))
+                cursor.execute("SET ivfflat.probes = %s", (ivfflat_probes,))
+                cursor.close()
+                dbapi_connection.autocommit = autocommit
+            
+            _engines[key] = engine
+        return engine
 
 class VectorService:
-    def __init__(self, database_url: str = None, openrouter_api_key: str = ""):
+    def __init__(
+        self,
+        database_url: str = None,
+        openrouter_api_key: str = "",
+        hnsw_ef_search: int = 40,
+        ivfflat_probes: int = 10
+    ):
         """
         Initialize vector service with pgvector (PostgreSQL)
-        Falls back gracefully if pgvector is not available
+        Falls back gracefully if pgvector is not available.
+        hnsw_ef_search / ivfflat_probes trade search latency for recall.
         """
         self.api_key = openrouter_api_key
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivfflat_probes = ivfflat_probes
+        self.headers = {
+            "Authorization": f"Bearer {openrouter_api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://membrane.app",
+            "X-Title": "The Membrane"
+        }
+        
+        # Embedding micro-batcher state, created lazily on the running event loop
+        self._embed_loop = None
+        self._embed_queue = None
+        self._embed_inflight = 0
+        self._batcher_task = None
+        
+        # content hash -> embedding; only touched on the event loop, so no lock
+        self._embedding_lru = LRUCache(maxsize=EMBED_MEMORY_CACHE_SIZE)
+        # normalized query hash -> embedding, same rules
+        self._query_lru = LRUCache(maxsize=EMBED_MEMORY_CACHE_SIZE)
+        
         self.database_url = database_url or os.getenv("DATABASE_URL", "")
         
         # Fix postgres:// to postgresql://
@@ -20,9 +302,10 @@ class VectorService:
         # Only initialize if we have a PostgreSQL database
         self.enabled = False
         self.use_pgvector = False
+        self.vector_index = None
         if self.database_url and not self.database_url.startswith("sqlite"):
             try:
-                self.engine = create_engine(self.database_url)
+                self.engine = _get_engine(self.database_url, hnsw_ef_search, ivfflat_probes)
                 self._ensure_table()
                 self.enabled = True
                 print(f"✅ VectorService initialized (pgvector: {self.use_pgvector})")
@@ -34,110 +317,344 @@ class VectorService:
             print("⚠️  VectorService disabled: SQLite detected (pgvector requires PostgreSQL)")
     
     def _ensure_table(self):
-        """Create vector embeddings table - uses JSONB if pgvector not available"""
-        # Try to enable pgvector extension in a separate transaction
-        self.use_pgvector = False
-        try:
+        """
+        Create vector embeddings table - stores quantized bytes if pgvector not available.
+        Runs once per database per process; later instances reuse the outcome.
+        """
+        with _schemas_lock:
+            known = _schemas.get(self.database_url)
+            if known is not None:
+                self.use_pgvector, self.vector_index = known
+                return
+            
+            # Read the catalog first; CREATE EXTENSION needs privileges and is
+            # only worth trying when pgvector is available but not yet enabled
             with self.engine.connect() as conn:
-                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
-                conn.commit()
-                self.use_pgvector = True
+                installed, available = conn.execute(_PGVECTOR_PROBE_STMT).one()
+            if not installed and available:
+                try:
+                    with self.engine.connect() as conn:
+                        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                        conn.commit()
+                        installed = True
+                except Exception as e:
+                    print(f"ℹ️  Could not enable pgvector: {e}")
+            
+            self.use_pgvector = bool(installed)
+            if self.use_pgvector:
                 print("✅ pgvector extension enabled")
-        except Exception as e:
-            # pgvector not available, use JSONB instead
-            print(f"ℹ️  pgvector not available, using JSONB fallback")
-        
-        # Now create/update table in a fresh transaction
-        with self.engine.connect() as conn:
-            # Check if table exists
-            result = conn.execute(text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = 'vector_embeddings'
-                )
-            """))
-            table_exists = result.scalar()
+            else:
+                # pgvector not available, use the BYTEA fallback instead
+                print("ℹ️  pgvector not available, using int8 fallback")
             
-            # If table exists, drop it to ensure clean schema
-            if table_exists:
-                print("🔄 Dropping existing vector_embeddings table for schema update")
-                conn.execute(text("DROP TABLE IF EXISTS vector_embeddings CASCADE"))
-                conn.commit()
+            # Uvicorn workers start together; let one set up the table at a time
+            with self.engine.connect() as lock_conn:
+                lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+                try:
+                    self._create_table()
+                    self._create_cache_table()
+                finally:
+                    lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
             
-            if self.use_pgvector:
-                # Use native vector type
-                conn.execute(text("""
-                    CREATE TABLE vector_embeddings (
-                        id SERIAL PRIMARY KEY,
-                        collection_name VARCHAR(255) NOT NULL,
-                        content TEXT NOT NULL,
-                        embedding vector(1536),
-                        metadata JSONB,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """))
+            _schemas[self.database_url] = (self.use_pgvector, self.vector_index)
+    
+    def _create_table(self):
+        """
+        Create the vector_embeddings table and its indexes if missing. The
+        layout check and DDL are skipped when vector_schema_meta already records
+        the current version for this pgvector mode.
+        """
+        embedding_type = "vector" if self.use_pgvector else "bytea"
+        with self.engine.connect() as conn:
+            conn.execute(_CREATE_SCHEMA_META_STMT)
+            meta = conn.execute(text("SELECT version, use_pgvector FROM vector_schema_meta WHERE id = 1")).first()
+            
+            if meta is None or tuple(meta) != (VECTOR_SCHEMA_VERSION, self.use_pgvector):
+                columns = dict(conn.execute(_VECTOR_TABLE_COLUMNS_STMT).all())
                 
-                # Create index for faster similarity search
-                try:
+                # Layouts from before content_hash (JSONB or float32 embeddings, an
+                # MD5 unique index), or from the other pgvector mode, can't be
+                # converted in place; their memories are re-indexed on re-upload
+                if columns and (columns.get("embedding") != embedding_type or "content_hash" not in columns):
+                    print("🔄 Rebuilding vector_embeddings: stored layout is from an older version")
+                    conn.execute(text("DROP TABLE vector_embeddings CASCADE"))
+                
+                if self.use_pgvector:
+                    # Use native vector type
                     conn.execute(text("""
-                        CREATE INDEX vector_embeddings_embedding_idx 
-                        ON vector_embeddings 
-                        USING ivfflat (embedding vector_cosine_ops)
-                        WITH (lists = 100)
+                        CREATE TABLE IF NOT EXISTS vector_embeddings (
+                            id SERIAL PRIMARY KEY,
+                            collection_name VARCHAR(255) NOT NULL,
+                            content TEXT NOT NULL,
+                            content_hash BYTEA NOT NULL,
+                            embedding vector(1536),
+                            metadata JSONB,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
                     """))
-                except Exception as idx_error:
-                    print(f"ℹ️  Could not create ivfflat index: {idx_error}")
-            else:
-                # Fallback: use JSONB for embeddings
+                else:
+                    # Fallback: int8-quantized unit vectors, ~1.5 KB per 1536-d row
+                    conn.execute(text("""
+                        CREATE TABLE IF NOT EXISTS vector_embeddings (
+                            id SERIAL PRIMARY KEY,
+                            collection_name VARCHAR(255) NOT NULL,
+                            content TEXT NOT NULL,
+                            content_hash BYTEA NOT NULL,
+                            embedding BYTEA,
+                            metadata JSONB,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """))
+                
+                # Create unique index to prevent duplicates; the 16-byte hash is
+                # computed once in Python instead of Postgres hashing content per insert
                 conn.execute(text("""
-                    CREATE TABLE vector_embeddings (
-                        id SERIAL PRIMARY KEY,
-                        collection_name VARCHAR(255) NOT NULL,
-                        content TEXT NOT NULL,
-                        embedding JSONB,
-                        metadata JSONB,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
+                    CREATE UNIQUE INDEX IF NOT EXISTS vector_embeddings_unique_idx 
+                    ON vector_embeddings (collection_name, content_hash)
                 """))
+                conn.execute(_UPSERT_SCHEMA_META_STMT, {"version": VECTOR_SCHEMA_VERSION, "use_pgvector": self.use_pgvector})
+                conn.commit()
+                print(f"✅ Vector table ready (using {'pgvector' if self.use_pgvector else 'int8 fallback'})")
             
-            # Create unique index to prevent duplicates
+            if self.use_pgvector:
+                # Keep an existing similarity index; otherwise create one
+                self.vector_index = conn.execute(_EMBEDDING_INDEX_METHOD_STMT).scalar()
+                if self.vector_index is None:
+                    version = conn.execute(text(
+                        "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+                    )).scalar()
+                    self.vector_index = "hnsw" if _parse_version(version) >= HNSW_MIN_VERSION else "ivfflat"
+                    try:
+                        with conn.begin_nested():
+                            if self.vector_index == "hnsw":
+                                conn.execute(text("""
+                                    CREATE INDEX vector_embeddings_embedding_idx 
+                                    ON vector_embeddings 
+                                    USING hnsw (embedding vector_cosine_ops)
+                                    WITH (m = 16, ef_construction = 64)
+                                """))
+                            else:
+                                conn.execute(text("""
+                                    CREATE INDEX vector_embeddings_embedding_idx 
+                                    ON vector_embeddings 
+                                    USING ivfflat (embedding vector_cosine_ops)
+                                    WITH (lists = 100)
+                                """))
+                    except Exception as idx_error:
+                        self.vector_index = None
+                        print(f"ℹ️  Could not create vector index: {idx_error}")
+            conn.commit()
+    
+    def _create_cache_table(self):
+        """Create the embedding cache table if missing"""
+        with self.engine.connect() as conn:
             conn.execute(text("""
-                CREATE UNIQUE INDEX vector_embeddings_unique_idx 
-                ON vector_embeddings (collection_name, MD5(content))
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    model VARCHAR(128) NOT NULL,
+                    content_hash BYTEA NOT NULL,
+                    embedding BYTEA NOT NULL,
+                    PRIMARY KEY (model, content_hash)
+                )
             """))
-            
             conn.commit()
-            print(f"✅ Vector table created (using {'pgvector' if self.use_pgvector else 'JSONB fallback'})")
     
-    async def _get_embedding(self, text: str) -> List[float]:
-        """Get embedding from OpenRouter API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://membrane.app",
-            "X-Title": "The Membrane"
-        }
+    @staticmethod
+    def _content_hash(content: str) -> bytes:
+        return hashlib.sha256(content.encode("utf-8")).digest()
+    
+    def _load_cached_embeddings(self, hashes: List[bytes]) -> Dict[bytes, List[float]]:
+        """Cached embeddings for the given content hashes (blocking; run via to_thread)"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                _CACHED_EMBEDDINGS_STMT,
+                {"model": EMBEDDING_MODEL, "hashes": hashes}
+            )
+            return {
+                bytes(row[0]): np.frombuffer(row[1], dtype=np.float32).tolist()
+                for row in rows
+            }
+    
+    def _store_cached_embeddings(self, embeddings: Dict[bytes, List[float]]):
+        """Save fresh embeddings as raw float32 bytes (blocking; run via to_thread)"""
+        with self.engine.connect() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO embedding_cache (model, content_hash, embedding)
+                    VALUES (:model, :hash, :embedding)
+                    ON CONFLICT DO NOTHING
+                """),
+                [
+                    {
+                        "model": EMBEDDING_MODEL,
+                        "hash": content_hash,
+                        "embedding": np.asarray(embedding, dtype=np.float32).tobytes()
+                    }
+                    for content_hash, embedding in embeddings.items()
+                ]
+            )
+            conn.commit()
+    
+    async def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Get embeddings for several texts, answering repeats from the embedding
+        cache and sending the rest in one OpenRouter API request
+        """
+        if not self.enabled:
+            return await self._request_embeddings(texts)
         
+        hashes = [self._content_hash(content) for content in texts]
+        try:
+            found = await asyncio.to_thread(self._load_cached_embeddings, list(set(hashes)))
+        except Exception as e:
+            print(f"⚠️  Embedding cache lookup failed: {e}")
+            found = {}
+        
+        # Each distinct missing text is sent once
+        missing = {}
+        for content, content_hash in zip(texts, hashes):
+            if content_hash not in found:
+                missing.setdefault(content_hash, content)
+        if missing:
+            fresh = dict(zip(missing, await self._request_embeddings(list(missing.values()))))
+            try:
+                await asyncio.to_thread(self._store_cached_embeddings, fresh)
+            except Exception as e:
+                print(f"⚠️  Embedding cache store failed: {e}")
+            found.update(fresh)
+        
+        return [found[content_hash] for content_hash in hashes]
+    
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for several texts in one OpenRouter API request"""
         payload = {
-            "model": "openai/text-embedding-3-small",
-            "input": text
+            "model": EMBEDDING_MODEL,
+            "input": texts
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/embeddings",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Check if response has expected format
-            if "data" not in data:
-                print(f"❌ OpenRouter embedding error: {data}")
-                raise Exception(f"OpenRouter API error: {data.get('error', {}).get('message', 'Unknown error')}")
-            
-            return data["data"][0]["embedding"]
+        client = get_http_client()
+        body = orjson.dumps(payload)
+        for attempt in range(1, EMBED_RETRY_ATTEMPTS + 1):
+            try:
+                response = await client.post(
+                    "https://openrouter.ai/api/v1/embeddings",
+                    headers=self.headers,
+                    content=body,
+                    timeout=SHORT_TIMEOUT
+                )
+            except httpx.TransportError as e:
+                if attempt == EMBED_RETRY_ATTEMPTS:
+                    raise
+                delay = _retry_delay(attempt, None)
+                print(f"⚠️  Embedding request failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in _RETRY_STATUSES or attempt == EMBED_RETRY_ATTEMPTS:
+                    break
+                delay = _retry_delay(attempt, response.headers.get("Retry-After"))
+                print(f"⚠️  Embedding request got {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        # Check if response has expected format
+        if "data" not in data:
+            print(f"❌ OpenRouter embedding error: {data}")
+            raise Exception(f"OpenRouter API error: {data.get('error', {}).get('message', 'Unknown error')}")
+        
+        # Results carry their input index; don't rely on response order
+        items = sorted(data["data"], key=lambda item: item.get("index", 0))
+        return [item["embedding"] for item in items]
+    
+    async def _get_embedding(self, text: str) -> List[float]:
+        """
+        Get an embedding from the in-process LRU, or else fetch it through the
+        persistent cache and API, remembering the result
+        """
+        content_hash = self._content_hash(text)
+        embedding = self._embedding_lru.get(content_hash)
+        if embedding is None:
+            embedding = await self._fetch_embedding(text)
+            self._embedding_lru[content_hash] = embedding
+        return embedding
+    
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Casefold and drop apostrophes and punctuation, e.g. "What's the API key?" -> whats the api key"""
+        words = _QUERY_NOISE.sub(" ", _QUERY_APOSTROPHES.sub("", query.casefold()))
+        return " ".join(words.split())
+    
+    async def _get_query_embedding(self, query: str) -> List[float]:
+        """Embedding for a lookup query, shared by trivially different spellings of it"""
+        normalized = self._normalize_query(query)
+        if not normalized:
+            return await self._get_embedding(query)
+        
+        key = self._content_hash(normalized)
+        embedding = self._query_lru.get(key)
+        if embedding is None:
+            embedding = await self._get_embedding(query)
+            self._query_lru[key] = embedding
+        return embedding
+    
+    async def _fetch_embedding(self, text: str) -> List[float]:
+        """
+        Get an embedding, coalescing concurrent callers into batched requests.
+        When nothing else is queued or in flight the request is sent directly.
+        """
+        loop = asyncio.get_running_loop()
+        if self._embed_loop is not loop:
+            # Queue and batcher are bound to the loop that created them
+            self._embed_loop = loop
+            self._embed_queue = asyncio.Queue(maxsize=EMBED_QUEUE_MAX)
+            self._embed_inflight = 0
+            self._batcher_task = loop.create_task(self._batcher())
+        
+        if self._embed_inflight == 0 and self._embed_queue.empty():
+            self._embed_inflight += 1
+            try:
+                return (await self._get_embeddings([text]))[0]
+            finally:
+                self._embed_inflight -= 1
+        
+        future = loop.create_future()
+        try:
+            self._embed_queue.put_nowait((text, future))
+        except asyncio.QueueFull:
+            raise EmbeddingQueueFull(f"{EMBED_QUEUE_MAX} embedding requests already queued")
+        return await future
+    
+    async def _batcher(self):
+        """Drain queued embedding requests into batches of up to EMBED_BATCH_MAX"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._embed_queue.get()]
+            deadline = loop.time() + EMBED_BATCH_WAIT
+            while len(batch) < EMBED_BATCH_MAX:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._embed_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Send without blocking the next batch from forming
+            loop.create_task(self._flush_batch(batch))
+    
+    async def _flush_batch(self, batch: List[Tuple[str, "asyncio.Future"]]):
+        """Embed a batch in one request and resolve each caller's future"""
+        self._embed_inflight += 1
+        try:
+            embeddings = await self._get_embeddings([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._embed_inflight -= 1
+        
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
     
     async def add_memory(
         self,
@@ -156,12 +673,60 @@ class VectorService:
             print(f"📄 File is large ({len(content)} chars), splitting into chunks")
             chunks = [content[i:i+max_chunk_size] for i in range(0, len(content), max_chunk_size)]
             
-            for idx, chunk in enumerate(chunks):
-                chunk_metadata = {**(metadata or {}), "chunk": idx + 1, "total_chunks": len(chunks)}
-                await self._add_single_memory(collection_name, chunk, chunk_metadata)
+            await self.add_memories_bulk(collection_name, [
+                (chunk, {**(metadata or {}), "chunk": idx + 1, "total_chunks": len(chunks)})
+                for idx, chunk in enumerate(chunks)
+            ])
         else:
             await self._add_single_memory(collection_name, content, metadata)
     
+    async def add_memories_bulk(
+        self,
+        collection_name: str,
+        items: List[Tuple[str, Optional[Dict]]]
+    ):
+        """
+        Add many (content, metadata) items, embedding as many texts per API
+        request as fit and storing each request's results in one INSERT.
+        Up to EMBED_REQUEST_CONCURRENCY requests run at once; if any fails the
+        others still finish and are stored before the first error is raised.
+        """
+        if not self.enabled:
+            print("⚠️  VectorService is disabled")
+            return
+        
+        semaphore = asyncio.Semaphore(EMBED_REQUEST_CONCURRENCY)
+        
+        async def add_batch(batch):
+            async with semaphore:
+                embeddings = await self._get_embeddings([content for content, _ in batch])
+            rows = [
+                (content, embedding, metadata)
+                for (content, metadata), embedding in zip(batch, embeddings)
+            ]
+            await asyncio.to_thread(self.add_embeddings, collection_name, rows)
+        
+        results = await asyncio.gather(
+            *(add_batch(batch) for batch in self._embedding_batches(items)),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+    
+    @staticmethod
+    def _embedding_batches(items: List[Tuple[str, Optional[Dict]]]):
+        """Split items into runs within EMBED_REQUEST_MAX_ITEMS / EMBED_REQUEST_MAX_CHARS"""
+        batch, batch_chars = [], 0
+        for item in items:
+            if batch and (len(batch) >= EMBED_REQUEST_MAX_ITEMS or batch_chars + len(item[0]) > EMBED_REQUEST_MAX_CHARS):
+                yield batch
+                batch, batch_chars = [], 0
+            batch.append(item)
+            batch_chars += len(item[0])
+        if batch:
+            yield batch
+    
     async def _add_single_memory(
         self,
         collection_name: str,
@@ -172,48 +737,87 @@ class VectorService:
             
         # Generate embedding via OpenRouter
         embedding = await self._get_embedding(content)
+        # The insert uses the sync engine; keep it off the event loop
+        await asyncio.to_thread(self.add_embedding, collection_name, content, embedding, metadata)
+    
+    async def embed(self, text: str) -> List[float]:
+        """Embed a lookup query with the same model used for stored memories"""
+        return await self._get_query_embedding(text)
+    
+    def add_embedding(
+        self,
+        collection_name: str,
+        content: str,
+        embedding: List[float],
+        metadata: Optional[Dict] = None
+    ):
+        """Store content under a precomputed embedding; a duplicate is skipped"""
+        self.add_embeddings(collection_name, [(content, embedding, metadata)])
+    
+    def add_embeddings(
+        self,
+        collection_name: str,
+        rows: List[Tuple[str, List[float], Optional[Dict]]]
+    ):
+        """
+        Store several (content, embedding, metadata) rows in one transaction;
+        duplicates are skipped. Batches of COPY_MIN_ROWS or more use COPY.
+        """
+        if not rows:
+            return
         
-        # Insert into database
+        if len(rows) >= COPY_MIN_ROWS:
+            self._copy_embeddings(collection_name, rows)
+            return
+        
+        if self.use_pgvector:
+            statement = _PGVECTOR_INSERT_STMT
+            encode = _vector_literal
+        else:
+            statement = _FALLBACK_INSERT_STMT
+            encode = self._pack_embedding
+        
+        params = [
+            {
+                "collection": collection_name,
+                "content": content,
+                "content_hash": _row_hash(content),
+                "embedding": encode(embedding),
+                "metadata": json.dumps(metadata or {})
+            }
+            for content, embedding, metadata in rows
+        ]
         with self.engine.connect() as conn:
+            conn.execute(statement, params)
+            conn.commit()
+    
+    def _copy_embeddings(
+        self,
+        collection_name: str,
+        rows: List[Tuple[str, List[float], Optional[Dict]]]
+    ):
+        """COPY rows into the session's staging table, then move them over with ON CONFLICT DO NOTHING"""
+        if self.use_pgvector:
+            encode, insert = _vector_literal, _PGVECTOR_INSERT_FROM_STAGING_STMT
+        else:
+            encode, insert = (lambda embedding: self._pack_embedding(embedding).hex()), _FALLBACK_INSERT_FROM_STAGING_STMT
+        
+        # Quote every field so empty strings aren't read as NULL
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for content, embedding, metadata in rows:
+            writer.writerow((collection_name, content, _row_hash(content).hex(), encode(embedding), json.dumps(metadata or {})))
+        buffer.seek(0)
+        
+        with self.engine.connect() as conn:
+            conn.execute(_CREATE_STAGING_STMT)
+            cursor = conn.connection.cursor()
             try:
-                if self.use_pgvector:
-                    # Use native vector type
-                    embedding_str = "[" + ",".join(str(x) for x in embedding) + "]"
-                    conn.execute(
-                        text("""
-                            INSERT INTO vector_embeddings 
-                            (collection_name, content, embedding, metadata)
-                            VALUES (:collection, :content, :embedding::vector, :metadata::jsonb)
-                        """),
-                        {
-                            "collection": collection_name,
-                            "content": content,
-                            "embedding": embedding_str,
-                            "metadata": json.dumps(metadata or {})
-                        }
-                    )
-                else:
-                    # Use JSONB - pass the JSON string directly without ::jsonb cast
-                    conn.execute(
-                        text("""
-                            INSERT INTO vector_embeddings 
-                            (collection_name, content, embedding, metadata)
-                            VALUES (:collection, :content, :embedding, :metadata)
-                        """),
-                        {
-                            "collection": collection_name,
-                            "content": content,
-                            "embedding": json.dumps(embedding),
-                            "metadata": json.dumps(metadata or {})
-                        }
-                    )
-                conn.commit()
-            except Exception as e:
-                # Likely a duplicate, ignore
-                if "duplicate" in str(e).lower() or "unique" in str(e).lower():
-                    pass
-                else:
-                    raise
+                cursor.copy_expert(_COPY_STAGING_SQL, buffer)
+            finally:
+                cursor.close()
+            conn.execute(insert)
+            conn.commit()
     
     async def search(
         self,
@@ -227,64 +831,142 @@ class VectorService:
             
         try:
             # Generate query embedding via OpenRouter
-            query_embedding = await self._get_embedding(query)
+            query_embedding = await self._get_query_embedding(query)
             
-            with self.engine.connect() as conn:
-                if self.use_pgvector:
-                    # Use native pgvector similarity search
-                    embedding_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
-                    results = conn.execute(
-                        text("""
-                            SELECT content
-                            FROM vector_embeddings
-                            WHERE collection_name = :collection
-                            ORDER BY embedding <=> :query_embedding::vector
-                            LIMIT :limit
-                        """),
-                        {
-                            "collection": collection_name,
-                            "query_embedding": embedding_str,
-                            "limit": top_k
-                        }
-                    )
-                else:
-                    # Fallback: compute cosine similarity in Python
-                    results = conn.execute(
-                        text("""
-                            SELECT content, embedding
-                            FROM vector_embeddings
-                            WHERE collection_name = :collection
-                        """),
-                        {"collection": collection_name}
-                    )
-                    
-                    # Compute similarities and sort
-                    docs_with_scores = []
-                    for row in results:
-                        content = row[0]
-                        # PostgreSQL JSONB is already deserialized to Python list
-                        embedding = row[1] if isinstance(row[1], list) else json.loads(row[1])
-                        similarity = self._cosine_similarity(query_embedding, embedding)
-                        docs_with_scores.append((content, similarity))
-                    
-                    # Sort by similarity and take top_k
-                    docs_with_scores.sort(key=lambda x: x[1], reverse=True)
-                    return [doc for doc, _ in docs_with_scores[:top_k]]
-                
-                return [row[0] for row in results]
+            return await asyncio.to_thread(self._search_embedding, collection_name, query_embedding, top_k)
         except Exception as e:
             print(f"Search error: {e}")
             import traceback
             traceback.print_exc()
             return []
     
-    def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        """Compute cosine similarity between two vectors"""
-        import math
-        dot_product = sum(x * y for x, y in zip(a, b))
-        norm_a = math.sqrt(sum(x * x for x in a))
-        norm_b = math.sqrt(sum(y * y for y in b))
-        return dot_product / (norm_a * norm_b) if norm_a and norm_b else 0.0
+    def _search_embedding(
+        self,
+        collection_name: str,
+        query_embedding: List[float],
+        top_k: int
+    ) -> List[str]:
+        """Nearest stored contents for an embedding (blocking; run via to_thread)"""
+        with self.engine.connect() as conn:
+            if self.use_pgvector:
+                # Use native pgvector similarity search
+                results = conn.execute(
+                    _PGVECTOR_SEARCH_STMT,
+                    {
+                        "collection": collection_name,
+                        "query_embedding": _vector_literal(query_embedding),
+                        "limit": top_k
+                    }
+                )
+                return [row[0] for row in results]
+            
+            # Fallback: score the collection's embeddings in NumPy, then fetch
+            # only the winning rows' content
+            results = conn.execute(
+                _FALLBACK_CANDIDATES_STMT,
+                {"collection": collection_name},
+                execution_options={"yield_per": SCORE_CHUNK_ROWS}
+            )
+            top = self._top_similar(query_embedding, results.partitions(), top_k)
+            contents = self._contents_by_id(conn, [row_id for row_id, _ in top])
+            return [contents[row_id] for row_id, _ in top if row_id in contents]
+    
+    def nearest(
+        self,
+        collection_name: str,
+        embedding: List[float],
+        where: Optional[Dict] = None
+    ) -> Optional[Tuple[str, float]]:
+        """Return the closest stored content and its cosine similarity, optionally filtered by metadata"""
+        if not self.enabled:
+            return None
+        
+        params = {
+            "collection": collection_name,
+            "where": json.dumps(where or {})
+        }
+        with self.engine.connect() as conn:
+            if self.use_pgvector:
+                params["query_embedding"] = _vector_literal(embedding)
+                row = conn.execute(_PGVECTOR_NEAREST_STMT, params).first()
+                return (row[0], float(row[1])) if row else None
+            
+            results = conn.execute(
+                _FALLBACK_FILTERED_CANDIDATES_STMT,
+                params,
+                execution_options={"yield_per": SCORE_CHUNK_ROWS}
+            )
+            best = self._top_similar(embedding, results.partitions(), 1)
+            if not best:
+                return None
+            row_id, similarity = best[0]
+            content = self._contents_by_id(conn, [row_id]).get(row_id)
+            return (content, similarity) if content is not None else None
+    
+    @staticmethod
+    def _contents_by_id(conn, row_ids: List[int]) -> Dict[int, str]:
+        if not row_ids:
+            return {}
+        return dict(conn.execute(_CONTENTS_BY_ID_STMT, {"ids": row_ids}).all())
+    
+    @staticmethod
+    def _normalized(embedding: List[float]) -> np.ndarray:
+        """Unit-length float32 copy of an embedding (zero vectors stay zero)"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    @classmethod
+    def _pack_embedding(cls, embedding: List[float]) -> bytes:
+        """
+        Fallback column encoding: the unit vector as int8 codes scaled to the
+        row's largest component, after a float32 dequantization step
+        """
+        vector = cls._normalized(embedding)
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        step = np.float32(peak / 127 if peak else 1.0)
+        codes = np.clip(np.round(vector / step), -127, 127).astype(np.int8)
+        return step.tobytes() + codes.tobytes()
+    
+    @classmethod
+    def _top_similar(cls, query_embedding: List[float], chunks, top_k: int) -> List[Tuple[str, float]]:
+        """
+        (key, cosine similarity) for the top_k of (key, packed embedding) rows,
+        best first. Rows arrive in chunks (e.g. Result.partitions()); only the
+        running top_k is kept between chunks, so memory doesn't grow with N.
+        """
+        if top_k <= 0:
+            return []
+        
+        query = cls._normalized(query_embedding)
+        best_keys, best_scores = [], np.empty(0, dtype=np.float32)
+        for chunk in chunks:
+            if not chunk:
+                continue
+            keys = best_keys + [key for key, _ in chunk]
+            scores = np.concatenate((best_scores, cls._score_packed(query, [embedding for _, embedding in chunk])))
+            if len(scores) > top_k:
+                keep = np.argpartition(-scores, top_k - 1)[:top_k]
+                best_keys, best_scores = [keys[i] for i in keep], scores[keep]
+            else:
+                best_keys, best_scores = keys, scores
+        
+        order = np.argsort(-best_scores, kind="stable")
+        return [(best_keys[i], float(best_scores[i])) for i in order]
+    
+    @staticmethod
+    def _score_packed(query: np.ndarray, packed: List[bytes]) -> np.ndarray:
+        """Cosine similarity of a unit query against packed embeddings, in one pass over the int8 codes"""
+        packed = np.frombuffer(b"".join(packed), dtype=np.uint8).reshape(len(packed), -1)
+        steps = packed[:, :4].copy().view(np.float32).ravel()
+        codes = packed[:, 4:].view(np.int8)
+        # einsum casts the int8 codes to float32 in small cache-sized buffers as
+        # it multiplies, so there is no float32 copy of the matrix; for this
+        # matrix-vector shape it also beats a BLAS sgemv on the cast copy.
+        # Scores are dequantized once afterwards.
+        scores = np.einsum("ij,j->i", codes, query, dtype=np.float32, casting="unsafe")
+        scores *= steps
+        return scores
     
     def delete_project_memories(self, collection_name: str):
         """Delete all memories for a collection"""
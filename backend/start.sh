@@ -5,4 +5,4 @@ set -e
 # python -m alembic upgrade head
 
 # Start the application
-exec uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000}
+exec uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000} --loop uvloop --http httptools --workers ${WEB_CONCURRENCY:-2} --log-level warning
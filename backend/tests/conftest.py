@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+from typing import Generator, List
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import Base
+
+
+@pytest.fixture
+def engine():
+    """Fresh in-memory SQLite database with the app schema"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine) -> Generator[Session, None, None]:
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def count_queries(engine):
+    """
+    Collect the SQL statements executed on the test engine inside the block:
+
+        with count_queries() as queries:
+            story_service.get_story_chapters(db, story_id)
+        assert len(queries) == 4
+    """
+    @contextmanager
+    def counter() -> Generator[List[str], None, None]:
+        queries: List[str] = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            queries.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield queries
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+    return counter
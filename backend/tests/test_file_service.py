@@ -0,0 +1,15 @@
+import json
+
+from services.file_service import FileService
+
+
+def test_json_to_text_keeps_oversized_integers_exact(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text('{"id": 12345678901234567890123, "nested": [98765432109876543210987654321]}')
+
+    text = FileService._json_to_text(str(path))
+
+    assert "12345678901234567890123" in text
+    assert "98765432109876543210987654321" in text
+    assert "e+" not in text
+    assert json.loads(text) == {"id": 12345678901234567890123, "nested": [98765432109876543210987654321]}
@@ -0,0 +1,42 @@
+import asyncio
+
+from services.openrouter_service import _iter_sse_data
+
+
+class FakeResponse:
+    """Just enough of httpx.Response for _iter_sse_data"""
+
+    def __init__(self, *chunks):
+        self.chunks = chunks
+
+    async def aiter_bytes(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _collect(*chunks):
+    async def run():
+        return [data async for data in _iter_sse_data(FakeResponse(*chunks))]
+    return asyncio.run(run())
+
+
+def test_data_field_with_or_without_space():
+    assert _collect(b'data: {"a":1}\ndata:{"b":2}\ndata:  {"c":3}\n') == [b'{"a":1}', b'{"b":2}', b' {"c":3}']
+
+
+def test_crlf_line_endings():
+    assert _collect(b'data: {"a":1}\r\n\r\ndata:{"b":2}\r\n\r\n') == [b'{"a":1}', b'{"b":2}']
+
+
+def test_lines_split_across_chunks():
+    assert _collect(b'da', b'ta: {"a"', b':1}\r', b'\ndata:', b'{"b":2}\n') == [b'{"a":1}', b'{"b":2}']
+
+
+def test_unterminated_final_line():
+    assert _collect(b'data: {"a":1}\ndata:{"b":2}') == [b'{"a":1}', b'{"b":2}']
+    assert _collect(b'data: {"a":1}\r\ndata: [DONE]') == [b'{"a":1}']
+
+
+def test_stops_at_done_and_skips_other_fields():
+    stream = b': OPENROUTER PROCESSING\n\nevent: message\nid: 1\ndata: {"a":1}\n\ndata:[DONE]\n\ndata: {"late":1}\n'
+    assert _collect(stream) == [b'{"a":1}']
@@ -0,0 +1,167 @@
+import asyncio
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+from services.semantic_cache import SemanticCache
+
+
+class FakeVectorService:
+    """In-memory stand-in for VectorService's embed / nearest / add_embedding"""
+
+    enabled = True
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.rows = []
+        self.embed_calls = 0
+
+    async def embed(self, text):
+        self.embed_calls += 1
+        return self.embeddings[text]
+
+    def nearest(self, collection_name, embedding, where=None):
+        # Same contract as the metadata @> :where filter
+        best = None
+        query = np.asarray(embedding) / np.linalg.norm(embedding)
+        for collection, content, stored, metadata in self.rows:
+            if collection != collection_name or not (where or {}).items() <= metadata.items():
+                continue
+            similarity = float(query @ (np.asarray(stored) / np.linalg.norm(stored)))
+            if best is None or similarity > best[1]:
+                best = (content, similarity)
+        return best
+
+    def add_embedding(self, collection_name, content, embedding, metadata=None):
+        self.rows.append((collection_name, content, embedding, metadata or {}))
+
+
+SCOPE = {"kind": "chat", "document": "abc"}
+
+
+@pytest.fixture
+def vectors():
+    return FakeVectorService({
+        "how do I start chapter two": [1.0, 0.0, 0.0],
+        "how should I start chapter two": [0.99, 0.05, 0.0],
+        "what is the villain's motive": [0.0, 1.0, 0.0]
+    })
+
+
+@pytest.fixture
+def cache(vectors):
+    return SemanticCache(vectors, threshold=0.95)
+
+
+def test_exact_tier_answers_before_embedding(cache, vectors):
+    cached, embedding = asyncio.run(cache.lookup_cached("c", "how do I start chapter two", SCOPE))
+    assert cached is None
+    assert vectors.embed_calls == 1
+
+    cache.remember("c", "how do I start chapter two", SCOPE, embedding, "Open on the storm.")
+
+    cached, embedding = asyncio.run(cache.lookup_cached("c", "how do I start chapter two", SCOPE))
+    assert cached == "Open on the storm."
+    assert embedding is None
+    assert vectors.embed_calls == 1
+
+
+def test_semantic_hit_is_promoted_to_the_exact_tier(cache, vectors):
+    embedding = vectors.embeddings["how do I start chapter two"]
+    cache.remember("c", "how do I start chapter two", SCOPE, embedding, "Open on the storm.")
+
+    cached, _ = asyncio.run(cache.lookup_cached("c", "how should I start chapter two", SCOPE))
+    assert cached == "Open on the storm."
+    assert vectors.embed_calls == 1
+
+    cached, _ = asyncio.run(cache.lookup_cached("c", "how should I start chapter two", SCOPE))
+    assert cached == "Open on the storm."
+    assert vectors.embed_calls == 1
+
+
+def test_dissimilar_query_misses(cache, vectors):
+    embedding = vectors.embeddings["how do I start chapter two"]
+    cache.remember("c", "how do I start chapter two", SCOPE, embedding, "Open on the storm.")
+
+    cached, embedding = asyncio.run(cache.lookup_cached("c", "what is the villain's motive", SCOPE))
+    assert cached is None
+    assert embedding == vectors.embeddings["what is the villain's motive"]
+
+
+def test_semantic_false_skips_the_similarity_tier(cache, vectors):
+    embedding = vectors.embeddings["how do I start chapter two"]
+    cache.remember("c", "how do I start chapter two", SCOPE, embedding, "Open on the storm.")
+
+    cached, _ = asyncio.run(cache.lookup_cached("c", "how should I start chapter two", SCOPE, semantic=False))
+    assert cached is None
+    assert vectors.embed_calls == 0
+
+
+def test_scope_must_match_in_both_tiers(cache, vectors):
+    embedding = vectors.embeddings["how do I start chapter two"]
+    cache.remember("c", "how do I start chapter two", SCOPE, embedding, "Open on the storm.")
+    edited = dict(SCOPE, document="def")
+
+    assert asyncio.run(cache.lookup_cached("c", "how do I start chapter two", edited))[0] is None
+    assert asyncio.run(cache.lookup_cached("c", "how should I start chapter two", edited))[0] is None
+    assert asyncio.run(cache.lookup_cached("other", "how do I start chapter two", SCOPE))[0] is None
+
+
+def test_blank_responses_are_not_remembered(cache, vectors):
+    embedding = vectors.embeddings["how do I start chapter two"]
+    cache.remember("c", "how do I start chapter two", SCOPE, embedding, "  ")
+
+    assert asyncio.run(cache.lookup_cached("c", "how do I start chapter two", SCOPE))[0] is None
+    assert vectors.rows == []
+
+
+@pytest.fixture(scope="module")
+def app_main(tmp_path_factory):
+    """main imported against a throwaway SQLite database"""
+    data_dir = tmp_path_factory.mktemp("app")
+    saved = {key: os.environ.get(key) for key in ("DATABASE_URL", "UPLOAD_DIR")}
+    os.environ["DATABASE_URL"] = f"sqlite:///{data_dir / 'app.db'}"
+    os.environ["UPLOAD_DIR"] = str(data_dir / "uploads")
+    try:
+        yield importlib.import_module("main")
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def test_ghost_suggest_no_cache_bypasses_both_tiers(app_main, vectors, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    cache = SemanticCache(vectors, threshold=0.95)
+    monkeypatch.setattr(app_main, "semantic_cache", cache)
+    calls = []
+
+    async def fake_suggestion(text, cursor_position, purpose, model):
+        calls.append(text)
+        return f"suggestion {len(calls)}"
+
+    monkeypatch.setattr(app_main.openrouter, "get_ghost_suggestion", fake_suggestion)
+
+    client = TestClient(app_main.app)
+    token = client.post(
+        "/api/auth/signup",
+        json={"email": "ghost@example.com", "password": "pw123456", "name": "Ghost"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    project_id = client.post("/api/projects", json={"name": "P"}, headers=headers).json()["id"]
+    body = {"text": "how do I start chapter two", "cursor_position": 26, "purpose": "novel"}
+    url = f"/api/projects/{project_id}/ghost-suggest"
+
+    assert client.post(url, json=body, headers=headers).json() == {"suggestion": "suggestion 1"}
+    assert client.post(url, json=body, headers=headers).json() == {"suggestion": "suggestion 1"}
+    assert len(calls) == 1
+
+    # no_cache neither reads nor replaces the cached suggestion
+    assert client.post(f"{url}?no_cache=true", json=body, headers=headers).json() == {"suggestion": "suggestion 2"}
+    assert client.post(url, json=body, headers=headers).json() == {"suggestion": "suggestion 1"}
+    assert len(calls) == 2
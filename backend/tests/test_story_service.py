@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from models import BeatScene, Chapter, Character, KeyEvent, PlotBrainstorm, Story, User, WorldBuildingElement
+from services.story_service import StoryService
+
+
+@pytest.fixture
+def story_service():
+    return StoryService(openrouter_api_key="test")
+
+
+def _seed_story(db, user_id, chapters=5):
+    """A story with characters, brainstorms and a few children under every chapter"""
+    story = Story(user_id=user_id, title="Story")
+    story.characters = [Character(name="Ada"), Character(name="Bo")]
+    story.plot_brainstorms = [PlotBrainstorm(notes="twist")]
+    for n in range(1, chapters + 1):
+        story.chapters.append(Chapter(
+            title=f"Chapter {n}",
+            text="text",
+            order=n,
+            beatscenes=[BeatScene(description="beat", order=1)],
+            keyevents=[KeyEvent(description="event", order=1)],
+            world_building=[WorldBuildingElement(category="Settings", description="place")]
+        ))
+    db.add(story)
+    db.commit()
+    return story.id
+
+
+@pytest.fixture
+def user_id(db):
+    user = User(email="writer@example.com", password_hash="x", name="Writer")
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def _selects(queries):
+    return [q for q in queries if q.lstrip().upper().startswith("SELECT")]
+
+
+def test_get_story_with_children_query_count(db, user_id, story_service, count_queries):
+    story_id = _seed_story(db, user_id)
+    db.expunge_all()
+
+    with count_queries() as queries:
+        story = story_service.get_story_with_children(db, story_id, user_id)
+
+    assert len(story.chapters) == 5
+    assert len(story.characters) == 2
+    assert len(queries) == 3
+
+
+def test_get_story_chapters_query_count(db, user_id, story_service, count_queries):
+    story_id = _seed_story(db, user_id)
+    db.expunge_all()
+
+    with count_queries() as queries:
+        chapters = story_service.get_story_chapters(db, story_id)
+        for chapter in chapters:
+            assert len(chapter.beatscenes) == 1
+            assert len(chapter.keyevents) == 1
+            assert len(chapter.world_building) == 1
+
+    assert [c.order for c in chapters] == [1, 2, 3, 4, 5]
+    assert len(queries) == 4
+
+
+def test_delete_story_loads_the_tree_in_seven_selects(db, user_id, story_service, count_queries):
+    story_id = _seed_story(db, user_id)
+    db.expunge_all()
+
+    with count_queries() as queries:
+        assert story_service.delete_story(db, story_id, user_id)
+
+    assert len(_selects(queries)) == 7
+    assert db.query(Chapter).count() == 0
+    assert db.query(BeatScene).count() == 0
+
+
+def test_get_story_with_children_raises_on_unloaded_relationships(db, user_id, story_service):
+    story_id = _seed_story(db, user_id)
+    db.expunge_all()
+
+    story = story_service.get_story_with_children(db, story_id, user_id)
+
+    with pytest.raises(InvalidRequestError):
+        story.plot_brainstorms
+    with pytest.raises(InvalidRequestError):
+        story.chapters[0].beatscenes
+
+
+def test_get_story_chapters_raises_on_unloaded_relationships(db, user_id, story_service):
+    story_id = _seed_story(db, user_id)
+    db.expunge_all()
+
+    chapters = story_service.get_story_chapters(db, story_id)
+
+    with pytest.raises(InvalidRequestError):
+        chapters[0].story
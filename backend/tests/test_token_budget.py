@@ -0,0 +1,95 @@
+import pytest
+
+from services import token_budget
+from services.token_budget import CHARS_PER_TOKEN, TRUNCATION_MARKER, trim_to_token_budget
+
+
+class ByteEncoder:
+    """One token per UTF-8 byte: the worst case a byte-level BPE can produce"""
+
+    def __init__(self):
+        self.encode_calls = 0
+
+    def encode(self, text, disallowed_special=()):
+        self.encode_calls += 1
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", errors="ignore")
+
+
+@pytest.fixture(autouse=True)
+def clear_trim_cache():
+    token_budget._trim_cache.clear()
+    yield
+    token_budget._trim_cache.clear()
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    encoder = ByteEncoder()
+    monkeypatch.setattr(token_budget, "_encoder", encoder)
+    monkeypatch.setattr(token_budget, "_encoder_loaded", True)
+    return encoder
+
+
+@pytest.fixture
+def no_encoder(monkeypatch):
+    monkeypatch.setattr(token_budget, "_encoder", None)
+    monkeypatch.setattr(token_budget, "_encoder_loaded", True)
+
+
+def test_short_ascii_text_is_returned_without_tokenizing(encoder):
+    assert trim_to_token_budget("hello", 10) == "hello"
+    assert encoder.encode_calls == 0
+
+
+def test_multibyte_text_under_the_char_count_is_still_tokenized(encoder):
+    text = "日本語のテキスト😀"  # 9 characters, 28 UTF-8 bytes
+
+    trimmed = trim_to_token_budget(text, 12)
+
+    assert encoder.encode_calls == 1
+    assert trimmed.startswith(TRUNCATION_MARKER)
+    assert len(trimmed[len(TRUNCATION_MARKER):].encode("utf-8")) <= 12
+    assert text.endswith(trimmed[len(TRUNCATION_MARKER):])
+
+
+def test_encoder_path_keeps_the_last_max_tokens(encoder):
+    text = "a" * 50 + "b" * 10
+
+    assert trim_to_token_budget(text, 10) == TRUNCATION_MARKER + "b" * 10
+    assert trim_to_token_budget(text, 60) == text
+
+
+def test_fallback_estimates_from_chars_per_token(no_encoder):
+    text = "x" * 100 + "tail"
+    max_tokens = 5
+
+    trimmed = trim_to_token_budget(text, max_tokens)
+
+    assert trimmed == TRUNCATION_MARKER + text[-max_tokens * CHARS_PER_TOKEN:]
+    assert trim_to_token_budget(text, len(text) // CHARS_PER_TOKEN + 1) == text
+
+
+def test_cache_key_reuses_the_trimmed_text(encoder):
+    text = "z" * 100
+
+    first = trim_to_token_budget(text, 10, cache_key="doc-hash")
+    second = trim_to_token_budget(text, 10, cache_key="doc-hash")
+
+    assert second == first
+    assert encoder.encode_calls == 1
+
+    # A different budget is a different entry
+    trim_to_token_budget(text, 20, cache_key="doc-hash")
+    assert encoder.encode_calls == 2
+
+
+def test_without_cache_key_every_call_tokenizes(encoder):
+    text = "z" * 100
+
+    trim_to_token_budget(text, 10)
+    trim_to_token_budget(text, 10)
+
+    assert encoder.encode_calls == 2
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from services.vector_service import SCORE_CHUNK_ROWS, VectorService
+
+DIMENSIONS = 1536
+# int8 codes scaled to each row's largest component: on random 1536-d vectors
+# the score error is ~2e-4 RMS, ~4e-4 typical worst case over a top 10
+SCORE_TOLERANCE = 5e-4
+
+
+def _unit(matrix):
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+
+def _chunks(rows, size=SCORE_CHUNK_ROWS):
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(1234)
+    vectors = rng.standard_normal((5000, DIMENSIONS)).astype(np.float32)
+    query = rng.standard_normal(DIMENSIONS).astype(np.float32)
+    # Ten planted neighbours at clearly separated similarities, so the exact
+    # top 10 is unambiguous despite quantization
+    noise = _unit(rng.standard_normal((10, DIMENSIONS)).astype(np.float32))
+    for rank, similarity in enumerate(np.linspace(0.9, 0.45, 10)):
+        vectors[rank * 487] = similarity * _unit(query) + np.sqrt(1 - similarity ** 2) * noise[rank]
+    rows = [(i, VectorService._pack_embedding(v.tolist())) for i, v in enumerate(vectors)]
+    exact = _unit(vectors) @ _unit(query)
+    return query, rows, exact
+
+
+def test_pack_embedding_round_trips_the_unit_vector():
+    rng = np.random.default_rng(7)
+    vector = rng.standard_normal(DIMENSIONS).astype(np.float32) * 3
+
+    packed = VectorService._pack_embedding(vector.tolist())
+
+    assert len(packed) == 4 + DIMENSIONS
+    step = np.frombuffer(packed[:4], dtype=np.float32)[0]
+    codes = np.frombuffer(packed[4:], dtype=np.int8)
+    assert np.abs(codes).max() == 127
+    np.testing.assert_allclose(codes * step, _unit(vector), atol=step / 2 + 1e-7)
+
+
+def test_pack_embedding_keeps_zero_vectors_zero():
+    packed = VectorService._pack_embedding([0.0] * DIMENSIONS)
+
+    scores = VectorService._score_packed(_unit(np.ones(DIMENSIONS, dtype=np.float32)), [packed])
+
+    assert scores.tolist() == [0.0]
+
+
+def test_score_packed_matches_exact_cosine(corpus):
+    query, rows, exact = corpus
+
+    scores = VectorService._score_packed(VectorService._normalized(query.tolist()), [packed for _, packed in rows])
+
+    errors = np.abs(scores - exact)
+    assert scores.dtype == np.float32
+    assert np.sqrt((errors ** 2).mean()) < 2.5e-4
+    assert errors.max() < 2 * SCORE_TOLERANCE
+
+
+def test_top_similar_matches_exact_top_10(corpus):
+    query, rows, exact = corpus
+
+    top = VectorService._top_similar(query.tolist(), _chunks(rows), 10)
+
+    assert [key for key, _ in top] == list(np.argsort(-exact)[:10])
+    for key, score in top:
+        assert abs(score - exact[key]) < SCORE_TOLERANCE
+
+
+def test_top_similar_merges_chunks_like_a_single_pass(corpus):
+    query, rows, _ = corpus
+    single = VectorService._top_similar(query.tolist(), [rows], 25)
+
+    # Uneven chunks, including empty ones and chunks smaller than top_k
+    chunked = VectorService._top_similar(query.tolist(), [[]] + _chunks(rows, 7) + [[]], 25)
+
+    assert chunked == single
+    scores = [score for _, score in chunked]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_top_similar_with_top_k_above_row_count():
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((5, DIMENSIONS)).astype(np.float32)
+    rows = [(f"row{i}", VectorService._pack_embedding(v.tolist())) for i, v in enumerate(vectors)]
+    query = vectors[2]
+
+    top = VectorService._top_similar(query.tolist(), _chunks(rows, 2), 50)
+
+    assert sorted(key for key, _ in top) == [f"row{i}" for i in range(5)]
+    assert top[0][0] == "row2"
+    assert top[0][1] == pytest.approx(1.0, abs=SCORE_TOLERANCE)
+    scores = [score for _, score in top]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_top_similar_handles_no_rows_and_zero_k():
+    query = [1.0] * DIMENSIONS
+
+    assert VectorService._top_similar(query, [], 10) == []
+    assert VectorService._top_similar(query, [[]], 10) == []
+    assert VectorService._top_similar(query, [[("a", VectorService._pack_embedding(query))]], 0) == []
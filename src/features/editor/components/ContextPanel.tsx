@@ -105,6 +105,12 @@ function ContextPanel({ memories, onRemoveMemory, projectId }: ContextPanelProps
     try {
       const result = await apiService.uploadFile(projectId, file, true);  // train=true
       console.log('Upload successful:', result);
+      // Indexing runs in the background; wait for it before refreshing the trained list
+      for (let attempt = 0; result.trained && attempt < 60; attempt++) {
+        const status = await apiService.getUploadStatus(projectId, result.id);
+        if (status.processed) break;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+      }
       await loadTrainedFiles();
       if (trainInputRef.current) {
         trainInputRef.current.value = '';
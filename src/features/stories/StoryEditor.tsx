@@ -1,7 +1,7 @@
 import { useState, useEffect, useMemo } from "react";
 import { useParams, useNavigate, Link } from "react-router-dom";
 import { useAuth } from "../../context/AuthContext";
-import { api, API_BASE_URL } from "../../services/api";
+import { api } from "../../services/api";
 import "./StoryEditor.css";
 
 interface Story {
@@ -544,22 +544,17 @@ export function StoryEditor() {
       // Construct prompt with FULL character data and all context
       const fullPrompt = `${prosePrompt}\n\nChapter Summary:\n${summaryStr}\n\n## CHARACTER INFORMATION (use this for characterization):\n${charStr}\n\nBeats/Scenes to Expand:\n${beatsStr}\n\nKey Events:\n${eventsStr}\n\nScene Input: ${sceneInput}\n\nCurrent chapter context:\n${chapterText}\n\nWorld Building Elements:\n${worldElementsStr}`;
 
-      // Call AI API
-      const response = await fetch(`${API_BASE_URL}/api/ai/generate`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${localStorage.getItem("auth_token")}`,
-        },
-        body: JSON.stringify({
-          prompt: fullPrompt,
-          type: "prose",
-          model: proseModel,
-        }),
-      });
-
-      const data = await response.json();
-      setAiProseResult(data.content || "No response from AI");
+      // Call AI API, streaming the result in as it's generated
+      let content = "";
+      for await (const chunk of api.streamAIGenerate({
+        prompt: fullPrompt,
+        type: "prose",
+        model: proseModel,
+      })) {
+        content += chunk;
+        setAiProseResult(content);
+      }
+      if (!content) setAiProseResult("No response from AI");
     } catch (error) {
       console.error("Failed to generate prose:", error);
       setAiProseResult("Error generating prose. Please try again.");
@@ -618,22 +613,17 @@ export function StoryEditor() {
       // Construct prompt with FULL character data and all context
       const fullPrompt = `${beatPrompt}\n\nChapter Summary:\n${summaryStr}\n\n## CHARACTER INFORMATION (use this for characterization):\n${charStr}\n\nExisting Beats/Scenes:\n${beatsStr}\n\nKey Events:\n${eventsStr}\n\nBeat/Scene Input: ${beatInput}\n\nCurrent chapter context:\n${chapterText}\n\nWorld Building Elements:\n${worldElementsStr}`;
 
-      // Call AI API
-      const response = await fetch(`${API_BASE_URL}/api/ai/generate`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${localStorage.getItem("auth_token")}`,
-        },
-        body: JSON.stringify({
-          prompt: fullPrompt,
-          type: "beat",
-          model: beatModel,
-        }),
-      });
-
-      const data = await response.json();
-      setAiBeatResult(data.content || "No response from AI");
+      // Call AI API, streaming the result in as it's generated
+      let content = "";
+      for await (const chunk of api.streamAIGenerate({
+        prompt: fullPrompt,
+        type: "beat",
+        model: beatModel,
+      })) {
+        content += chunk;
+        setAiBeatResult(content);
+      }
+      if (!content) setAiBeatResult("No response from AI");
     } catch (error) {
       console.error("Failed to generate beat:", error);
       setAiBeatResult("Error generating beat. Please try again.");
@@ -693,21 +683,17 @@ USER QUESTION: ${queryInput}
 
 Answer the user's question based on the context above. If the information isn't available, say so clearly.`;
 
-      const response = await fetch(`${API_BASE_URL}/api/ai/generate`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${localStorage.getItem("auth_token")}`,
-        },
-        body: JSON.stringify({
-          prompt: contextPrompt,
-          type: "query",
-          model: proseModel,
-        }),
-      });
-
-      const data = await response.json();
-      setQueryResult(data.content || "No response from AI");
+      // Stream the result in as it's generated
+      let content = "";
+      for await (const chunk of api.streamAIGenerate({
+        prompt: contextPrompt,
+        type: "query",
+        model: proseModel,
+      })) {
+        content += chunk;
+        setQueryResult(content);
+      }
+      if (!content) setQueryResult("No response from AI");
     } catch (error) {
       console.error("Failed to query context:", error);
       setQueryResult("Error querying context. Please try again.");
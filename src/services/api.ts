@@ -270,6 +270,15 @@ class APIService {
       throw new Error(`Stream error: ${response.statusText}`);
     }
 
+    // Cached answers come back as a single JSON body instead of an event stream
+    if (response.headers.get("content-type")?.includes("application/json")) {
+      const data = await response.json();
+      if (data.content) {
+        yield data.content;
+      }
+      return;
+    }
+
     const reader = response.body?.getReader();
     const decoder = new TextDecoder();
 
@@ -303,6 +312,73 @@ class APIService {
     }
   }
 
+  async *streamAIGenerate(params: {
+    prompt: string;
+    type: string;
+    model: string;
+  }): AsyncGenerator<string> {
+    const response = await fetch(`${API_BASE_URL}/api/ai/generate`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        ...this.getAuthHeaders(),
+      },
+      body: JSON.stringify({ ...params, stream: true }),
+    });
+
+    if (!response.ok) {
+      throw new Error(`Generation error: ${response.statusText}`);
+    }
+
+    // Cached answers come back as a single JSON body instead of an event stream
+    if (response.headers.get("content-type")?.includes("application/json")) {
+      const data = await response.json();
+      if (data.content) {
+        yield data.content;
+      }
+      return;
+    }
+
+    const reader = response.body?.getReader();
+    const decoder = new TextDecoder();
+
+    if (!reader) {
+      throw new Error("No reader available");
+    }
+
+    let buffer = "";
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop() ?? "";
+
+      for (const line of lines) {
+        if (line.startsWith("data: ")) {
+          const data = line.slice(6);
+          if (data === "[DONE]") {
+            return;
+          }
+          let parsed;
+          try {
+            parsed = JSON.parse(data);
+          } catch (e) {
+            // Skip invalid JSON
+            continue;
+          }
+          if (parsed.error) {
+            throw new Error(parsed.error);
+          }
+          if (parsed.content) {
+            yield parsed.content;
+          }
+        }
+      }
+    }
+  }
+
   async getGhostSuggestion(params: {
     text: string;
     cursorPosition: number;
@@ -394,6 +470,13 @@ class APIService {
     return data.files;
   }
 
+  async getUploadStatus(projectId: number, fileId: number): Promise<{ id: number; processed: boolean }> {
+    const response = await this.fetchAPI(
+      `/api/projects/${projectId}/upload/file/${fileId}/status`
+    );
+    return response.json();
+  }
+
   async deleteFile(projectId: number, fileId: number): Promise<void> {
     await this.fetchAPI(`/api/projects/${projectId}/upload/file/${fileId}`, {
       method: "DELETE",
@@ -483,6 +566,17 @@ class APIService {
     return response.json();
   }
 
+  async createCharactersBulk(
+    storyId: number,
+    characters: { name: string; traits?: string; backstory?: string }[]
+  ): Promise<{ characters: any[] }> {
+    const response = await this.fetchAPI(`/api/stories/${storyId}/characters/bulk`, {
+      method: "POST",
+      body: JSON.stringify(characters),
+    });
+    return response.json();
+  }
+
   async getCharacters(storyId: number): Promise<{ characters: any[] }> {
     const response = await this.fetchAPI(`/api/stories/${storyId}/characters`);
     return response.json();
@@ -499,6 +593,17 @@ class APIService {
     return response.json();
   }
 
+  async createBeatsBulk(
+    chapterId: number,
+    beats: { description: string; order?: number }[]
+  ): Promise<{ beats: any[] }> {
+    const response = await this.fetchAPI(`/api/chapters/${chapterId}/beats/bulk`, {
+      method: "POST",
+      body: JSON.stringify(beats),
+    });
+    return response.json();
+  }
+
   async getBeats(chapterId: number): Promise<{ beats: any[] }> {
     const response = await this.fetchAPI(`/api/chapters/${chapterId}/beats`);
     return response.json();